@@ -2,12 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException
 from app.services.admin_service import (
     deactivate_user,
     activate_user,
-    get_users_with_filters
+    get_users_with_filters,
+    resolve_sort_field,
+    stream_users
 )
 from app.services.achievement_service import grant_achievement, create_achievement
+from app.services.password_service import password_hasher
+from app.services.user_cache import user_cache
+from app.database.read_routing import read_only
 from app.database.database import get_db
 from bson import ObjectId
 from fastapi import Query
+from fastapi.responses import StreamingResponse
 
 router = APIRouter(tags=["Admin"])
 
@@ -29,6 +35,7 @@ async def grant_achievement_endpoint(user_id: str, achievement_id: str):
     return {"message": "Achievement granted"}
 
 @router.get("/users")
+@read_only
 async def get_users(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
@@ -36,7 +43,9 @@ async def get_users(
     sort_order: int = Query(-1),
     search: str = Query(None),
     user_type: str = Query(None),
-    is_active: bool = Query(None)
+    is_active: bool = Query(None),
+    cursor: str = Query(None, description="next_cursor из предыдущего ответа; заменяет page"),
+    estimated_total: bool = Query(False, description="Приблизительный total без фильтров")
 ):
     return await get_users_with_filters(
         page=page,
@@ -45,7 +54,34 @@ async def get_users(
         sort_order=sort_order,
         search=search,
         user_type=user_type,
-        is_active=is_active
+        is_active=is_active,
+        cursor=cursor,
+        estimated_total=estimated_total
+    )
+
+@router.get("/users/export")
+@read_only
+async def export_users(
+    sort_by: str = Query("created_at"),
+    sort_order: int = Query(-1),
+    search: str = Query(None),
+    user_type: str = Query(None),
+    is_active: bool = Query(None)
+):
+    """
+    Выгружает пользователей в формате NDJSON (один пользователь на строку).
+    """
+    # Параметры проверяются до StreamingResponse, пока еще можно ответить 400
+    sort_field = resolve_sort_field(sort_by)
+    return StreamingResponse(
+        stream_users(
+            sort_field=sort_field,
+            sort_order=sort_order,
+            search=search,
+            user_type=user_type,
+            is_active=is_active
+        ),
+        media_type="application/x-ndjson"
     )
 
 @router.post("/create_achievement")
@@ -53,4 +89,18 @@ async def create_achievement_endpoint(name: str, picture_url: str):
     message= await create_achievement(name, picture_url)
     if not message:
         raise HTTPException(status_code=404, detail="Error")
-    return message
\ No newline at end of file
+    return message
+
+@router.get("/metrics/password-hashing")
+async def password_hashing_metrics():
+    """
+    Загрузка пула хеширования паролей.
+    """
+    return password_hasher.stats()
+
+@router.get("/metrics/user-cache")
+async def user_cache_metrics():
+    """
+    Статистика кэша профилей пользователей.
+    """
+    return user_cache.stats()
@@ -0,0 +1,59 @@
+"""
+Условные GET-запросы для маршрутов чтения.
+
+ETag считается как хеш ответа, поэтому он меняется при любом изменении данных,
+включая название категории или данные организатора, которые хранятся в других
+документах. Изображения в хеш попадают ключами, а не подписанными ссылками:
+ссылки подписываются в каждом воркере отдельно, и ETag неизменного ресурса
+иначе отличался бы между воркерами. Вместо самих ссылок в хеш входит номер
+окна подписи (storage.signing_epoch): когда ссылки подписываются заново, ETag
+меняется, и клиент не держит по 304 тело с истекшими ссылками. Если клиент
+прислал тот же ETag в If-None-Match, отдается пустой ответ 304.
+"""
+from fastapi import Request, Response, status
+from app.api.responses import render_json
+from app.schemas.schemas import STORED_IMAGES_CONTEXT
+from app.services.storage_service import storage
+from typing import Any, Optional
+import hashlib
+import orjson
+
+# Политики Cache-Control по маршрутам
+CACHE_POLICIES = {
+    # Категории меняются редко и одинаковы для всех
+    "categories": "public, max-age=300",
+    # Мероприятие может измениться в любой момент - кэшировать можно, но только с проверкой
+    "event_detail": "public, no-cache",
+    # Профиль пользователя не должен попадать в общие кэши
+    "user_detail": "private, no-cache",
+}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def compute_etag(content: Any) -> str:
+    """
+    ETag по сохраненному представлению content (ключи изображений вместо ссылок)
+    и текущему окну подписи ссылок.
+    """
+    digest = hashlib.sha256(render_json(content, context=STORED_IMAGES_CONTEXT, option=orjson.OPT_SORT_KEYS))
+    digest.update(f":{storage.signing_epoch()}".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def cached_json_response(request: Request, content: Any, policy: str) -> Response:
+    """
+    Возвращает 200 с ETag и Cache-Control или 304, если у клиента уже есть
+    актуальная версия; тело ответа сериализуется только для 200.
+    """
+    etag = compute_etag(content)
+    headers = {"ETag": etag, "Cache-Control": CACHE_POLICIES[policy]}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=render_json(content), media_type="application/json", headers=headers)
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from app.api.caching import cached_json_response
+from app.database.read_routing import read_only
 from app.schemas.schemas import Category
 from app.services import category_service
 from typing import List
@@ -16,12 +18,14 @@ async def create_category(name: str):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.get("/categories", response_model=List[Category])
-async def get_all_categories():
+@read_only
+async def get_all_categories(request: Request):
     """
     Возвращает список всех категорий.
+    Поддерживает условный запрос через If-None-Match.
     """
     try:
-        return await category_service.get_all_categories()
+        return cached_json_response(request, await category_service.get_all_categories(), "categories")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.schemas.schemas import Event, EventCreate
-from app.services.event_service import create_event, get_all_events,update_event_picture,get_full_info_about_event
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.schemas.schemas import Event, EventCreate, EventPage, ParticipantPage, RegistrationStatus, Status
+from app.services.event_service import create_event, get_events_page,stream_events,update_event_picture,get_full_info_about_event
 from app.database.database import get_db
+from app.api.caching import cached_json_response
+from app.api.responses import ORJSONResponse
+from app.database.read_routing import read_only
+from app.services.registration_service import list_participants
+from datetime import datetime
+from typing import Optional
 
 router = APIRouter(tags=["Event"])
 
@@ -9,7 +16,7 @@ router = APIRouter(tags=["Event"])
 @router.post("/{user_id}/create", response_model=Event)
 async def create_new_event(event_data: EventCreate, user_id: str):
     try:
-        return await create_event(event_data, user_id)
+        return ORJSONResponse(await create_event(event_data, user_id))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -21,24 +28,109 @@ async def update_event_picture_endpoint(event_id: str, event_picture_url: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@router.get("/")
-async def get_all_events_endpoint():
+@router.get("/", response_model=EventPage)
+@read_only
+async def get_all_events_endpoint(
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущего ответа"),
+    limit: int = Query(20, ge=1, le=100),
+    category_id: Optional[str] = Query(None),
+    status: Optional[Status] = Query(None),
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None)
+):
+    """
+    Возвращает страницу мероприятий, отсортированных по дате.
+    Для получения следующей страницы передайте next_cursor в параметр cursor.
+    """
     try:
-        return await get_all_events()
+        return ORJSONResponse(await get_events_page(
+            limit=limit,
+            cursor=cursor,
+            category_id=category_id,
+            event_status=status,
+            date_from=date_from,
+            date_to=date_to
+        ))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.get("/export")
+@read_only
+async def export_events_endpoint(
+    category_id: Optional[str] = Query(None),
+    status: Optional[Status] = Query(None),
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None)
+):
+    """
+    Выгружает все мероприятия в формате NDJSON (одно мероприятие на строку).
+    """
+    return StreamingResponse(
+        stream_events(
+            category_id=category_id,
+            event_status=status,
+            date_from=date_from,
+            date_to=date_to
+        ),
+        media_type="application/x-ndjson"
+    )
+
 @router.get("/{event_id}", response_model=Event)
-async def get_full_event_info_endpoint(event_id: str):
+async def get_full_event_info_endpoint(event_id: str, request: Request):
     """
     Возвращает полную информацию о мероприятии по его ID, включая название категории.
+    Поддерживает условный запрос через If-None-Match.
     """
     try:
         event = await get_full_info_about_event(event_id)
         if not event:
             raise HTTPException(status_code=404, detail="Event not found")
-        return event
+        return cached_json_response(request, event, "event_detail")
     except HTTPException as http_ex:
         raise http_ex 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{event_id}/participants", response_model=ParticipantPage)
+@read_only
+async def get_event_participants_endpoint(
+    event_id: str,
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущего ответа"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    Возвращает страницу участников мероприятия в порядке записи.
+    Для получения следующей страницы передайте next_cursor в параметр cursor.
+    """
+    try:
+        return ORJSONResponse(await list_participants(event_id, limit=limit, cursor=cursor))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{event_id}/waitlist", response_model=ParticipantPage)
+@read_only
+async def get_event_waitlist_endpoint(
+    event_id: str,
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущего ответа"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    Возвращает страницу листа ожидания мероприятия в порядке очереди.
+    """
+    try:
+        return ORJSONResponse(await list_participants(
+            event_id,
+            limit=limit,
+            cursor=cursor,
+            registration_status=RegistrationStatus.WAITLISTED
+        ))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
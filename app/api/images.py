@@ -1,74 +1,204 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
-from PIL import Image
-import boto3
-from dotenv import load_dotenv
-import io
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from app.services.image_service import sniff_image_format, image_processor, DERIVATIVE_FORMAT, DERIVATIVE_CONTENT_TYPE
+from app.services.storage_service import storage, LocalStorageBackend
+from app.services import blob_service
+from app.api.caching import etag_matches
+from config import settings
+from typing import Tuple
+import asyncio
+import hashlib
+import mimetypes
 import os
-import uuid
-from fastapi.responses import FileResponse
+import tempfile
 
 router = APIRouter(tags=["Images"])
 
-load_dotenv()
+UPLOAD_PATHS = ("/api/images/upload-picture",)
 
-# Backblaze B2 Credentials from environment variables
-KEY_ID = os.getenv("BACKBLAZE_KEY_ID")
-APPLICATION_KEY = os.getenv("BACKBLAZE_APPLICATION_KEY")
-ENDPOINT_URL = os.getenv("BACKBLAZE_ENDPOINT_URL")
-BUCKET_NAME = os.getenv("BACKBLAZE_BUCKET_NAME")
 
-# Initialize B2 client
-s3_client = boto3.client(
-    "s3",
-    endpoint_url=ENDPOINT_URL,
-    aws_access_key_id=KEY_ID,
-    aws_secret_access_key=APPLICATION_KEY,
-    config=boto3.session.Config(signature_version='v4', s3={'checksum_algorithm': None}) #Попробуем отключить совсем
-)
+class UploadSizeLimitMiddleware:
+    """
+    Отклоняет загрузку изображения по заголовку Content-Length до того,
+    как тело запроса будет прочитано и сохранено во временный файл.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in UPLOAD_PATHS:
+            headers = dict(scope["headers"])
+            content_length = headers.get(b"content-length")
+            if content_length and content_length.isdigit() and int(content_length) > _max_request_bytes():
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": "File is too large"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def _max_request_bytes() -> int:
+    # Запас на заголовки multipart
+    return settings.UPLOAD_MAX_BYTES + 64 * 1024
+
+
+async def _spool_upload(file: UploadFile, first_chunk: bytes, path: str) -> Tuple[str, int]:
+    """
+    Копирует загруженный файл на диск частями по UPLOAD_PART_SIZE, считая sha256 по ходу чтения.
+    Прерывает загрузку, если файл оказался больше UPLOAD_MAX_BYTES.
+    Возвращает (hex sha256, размер).
+    """
+    digest = hashlib.sha256()
+    total = 0
+    chunk = first_chunk
+    with open(path, "wb") as local_copy:
+        while chunk:
+            total += len(chunk)
+            if total > settings.UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="File is too large")
+            digest.update(chunk)
+            await run_in_threadpool(local_copy.write, chunk)
+            chunk = await file.read(settings.UPLOAD_PART_SIZE)
+    return digest.hexdigest(), total
+
+
+async def _read_file_parts(path: str):
+    with open(path, "rb") as source:
+        while True:
+            chunk = await run_in_threadpool(source.read, settings.UPLOAD_PART_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def _upload_file(path: str, key: str, content_type: str):
+    with open(path, "rb") as fileobj:
+        await storage.upload_fileobj(fileobj, key, content_type)
+
+
+async def _store_new_image(digest: str, size: int, original_path: str, work_dir: str,
+                           extension: str, content_type: str) -> dict:
+    """
+    Строит производные изображения, загружает оригинал и варианты в хранилище
+    и регистрирует объект в image_blobs.
+    """
+    try:
+        derivative_paths = await image_processor.render(original_path, work_dir)
+    except Exception as e:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Image processing failed: {str(e)}"
+        )
+
+    key = blob_service.blob_key(digest, extension)
+    variant_keys = {
+        name: blob_service.variant_key(digest, name, DERIVATIVE_FORMAT)
+        for name in derivative_paths
+    }
+    try:
+        await asyncio.gather(
+            storage.upload_stream(_read_file_parts(original_path), key, content_type),
+            *[
+                _upload_file(path, variant_keys[name], DERIVATIVE_CONTENT_TYPE)
+                for name, path in derivative_paths.items()
+            ]
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"B2 upload failed: {str(e)}"
+        )
+    return await blob_service.register_blob(digest, key, content_type, size, variant_keys)
+
 
 @router.patch("/upload-picture")
 async def upload_profile_picture(file: UploadFile = File(...)):
     """
     Загружает изображение профиля пользователя в Backblaze B2,
     обрабатывает его и возвращает ссылку на изображение.
+    Повторная загрузка того же файла не сохраняет новую копию.
     """
     try:
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        file_name = f"{uuid.uuid4()}.{image.format.lower()}"
+        if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="File is too large")
 
-        try:
-            s3_client.upload_fileobj(
-                Fileobj=io.BytesIO(contents),
-                Bucket=BUCKET_NAME,
-                Key=file_name,
-                ExtraArgs={"ContentType": file.content_type}
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"B2 upload failed: {str(e)}"
-            )
+        first_chunk = await file.read(settings.UPLOAD_PART_SIZE)
+        image_format = sniff_image_format(first_chunk)
+        if not image_format:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+        extension, content_type = image_format
+
+        with tempfile.TemporaryDirectory(prefix="upload-") as work_dir:
+            original_path = os.path.join(work_dir, f"original.{extension}")
+            digest, size = await _spool_upload(file, first_chunk, original_path)
+
+            # Загрузка не ссылка: refcount увеличится, когда ключ запишут в профиль или мероприятие
+            blob = await blob_service.touch_blob(digest)
+            if not blob:
+                blob = await _store_new_image(digest, size, original_path, work_dir, extension, content_type)
         
         try:
-            presigned_url = s3_client.generate_presigned_url(
-                ClientMethod='get_object',
-                Params={
-                    'Bucket': BUCKET_NAME,
-                    'Key': file_name
-                },
-                ExpiresIn=604800
-            )
+            image_url = storage.url(blob["key"])
+            variant_urls = {name: storage.url(key) for name, key in blob["variants"].items()}
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"URL generation failed: {str(e)}"
             )
 
-        return {"profile_picture": presigned_url}
+        # В profile-picture и event-picture лучше передавать key: ссылка нужна только для показа
+        return {
+            "profile_picture": image_url,
+            "key": blob["key"],
+            "variants": variant_urls,
+            "variant_keys": blob["variants"]
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Internal error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/{key:path}")
+async def get_image(key: str, request: Request):
+    """
+    Отдает изображение из локального хранилища с поддержкой ETag и Range.
+    Для S3 перенаправляет на подписанную ссылку - только для загруженных через
+    приложение изображений (image_blobs), чтобы не подписывать произвольные ключи бакета.
+    """
+    if not isinstance(storage, LocalStorageBackend):
+        if not await blob_service.find_blob_by_key(key):
+            raise HTTPException(status_code=404, detail="Image not found")
+        return RedirectResponse(storage.url(key), status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    try:
+        path = storage.path_for(key)
+        stat_result = await run_in_threadpool(os.stat, path)
+    except (ValueError, FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        # Объекты в images/ адресуются хешем содержимого и никогда не меняются
+        "Cache-Control": "public, max-age=31536000, immutable" if key.startswith("images/") else "public, max-age=3600",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # FileResponse сам обрабатывает Range/If-Range и использует http.response.pathsend,
+    # если сервер его поддерживает (отдача файла без копирования через приложение)
+    return FileResponse(
+        path,
+        media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        headers=headers,
+        stat_result=stat_result
+    )
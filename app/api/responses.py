@@ -0,0 +1,34 @@
+"""
+JSON-ответы через orjson.
+
+Модели, прочитанные из базы, уже собраны без валидации (from_document), поэтому
+маршруты отдают их через ORJSONResponse напрямую: FastAPI не валидирует их
+повторно по response_model и не прогоняет через jsonable_encoder.
+"""
+from fastapi.responses import JSONResponse
+from bson import ObjectId
+from pydantic import BaseModel
+from typing import Any, Optional
+import functools
+import orjson
+
+
+def _default(value: Any, context: Optional[dict] = None):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True, context=context)
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def render_json(content: Any, context: Optional[dict] = None, option: int = 0) -> bytes:
+    """
+    context передается в model_dump моделей (например, STORED_IMAGES_CONTEXT).
+    """
+    default = _default if context is None else functools.partial(_default, context=context)
+    return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS | option)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return render_json(content)
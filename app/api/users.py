@@ -1,18 +1,21 @@
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from app.schemas.schemas import User, UserCreate
-from app.services.user_service import create_user, get_full_info_about_user, add_friend_service, register_user_for_event, authenticate_user, update_user
-from app.database.database import get_db
+from app.services.user_service import create_user, get_full_info_about_user, add_friend_service, register_user_for_event, cancel_user_registration, authenticate_user, update_user
 from bson.errors import InvalidId
 from fastapi import Query
-from app.services import event_service
+from app.services import event_service, user_service
+from app.api.caching import cached_json_response
+from app.api.responses import ORJSONResponse
+from app.database.read_routing import read_only
+import asyncio
 
 router = APIRouter(tags=["User"])
 
 @router.post("/register", response_model=User)
 async def register(user_data: UserCreate):
     try:
-        return await create_user(user_data)
+        return ORJSONResponse(await create_user(user_data))
     except HTTPException:
         raise
     except Exception as e:
@@ -30,7 +33,7 @@ async def login_for_access_token(email,password):
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    return ORJSONResponse(user)
 
 @router.patch("/{user_id}", response_model=User)
 async def update_user_endpoint(user_id: str, user_data: dict):
@@ -77,11 +80,11 @@ async def update_user_endpoint(user_id: str, user_data: dict):
         }
     }
 )
-async def get_user_info(user_id: str):
+async def get_user_info(user_id: str, request: Request):
     user = await get_full_info_about_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return cached_json_response(request, user, "user_detail")
 
 
 @router.post("/add_friend")  # Лучше использовать POST для таких операций
@@ -106,15 +109,36 @@ async def add_friend_endpoint(
 
 @router.post("/{event_id}/register/{user_id}")
 async def register_user_for_event_(event_id: str, user_id: str):
+    """
+    Записывает пользователя на мероприятие. Если мест нет, пользователь попадает
+    в лист ожидания (status: waitlisted) и будет записан, когда место освободится.
+    """
+    try:
+        registration_status = await register_user_for_event(event_id, user_id)
+        if registration_status == "waitlisted":
+            return {"message": "User added to the waitlist", "status": registration_status}
+        return {"message": "User registered for event", "status": registration_status}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/{event_id}/register/{user_id}")
+async def cancel_registration_for_event(event_id: str, user_id: str):
+    """
+    Отменяет запись на мероприятие (или место в листе ожидания).
+    Освободившееся место получает первый из листа ожидания.
+    """
     try:
-        await register_user_for_event(event_id, user_id)
-        return {"message": "User registered for event"}
+        promoted = await cancel_user_registration(event_id, user_id)
+        return {"message": "Registration cancelled", "promoted": promoted}
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/home/{user_id}", response_model=dict)
+@read_only
 async def get_homepage_data(user_id: str):
     """
     Возвращает данные для главной страницы пользователя:
@@ -124,29 +148,33 @@ async def get_homepage_data(user_id: str):
     - Мероприятия на этой неделе.
     """
     try:    
-        favorite_events = await event_service.get_favorite_events(user_id)
-        planned_events = await event_service.get_future_events_for_user(user_id)
-        today_events = await event_service.get_today_events()
-        this_week_events = await event_service.get_this_week_events()
+        # Запросы независимы, поэтому выполняем их параллельно
+        favorite_events, planned_events, today_events, this_week_events = await asyncio.gather(
+            event_service.get_favorite_events(user_id),
+            event_service.get_future_events_for_user(user_id),
+            event_service.get_today_events(),
+            event_service.get_this_week_events()
+        )
 
-        return {     
+        return ORJSONResponse({
             "favorite_events": favorite_events,
             "planned_events": planned_events,
             "today_events": today_events,
             "this_week_events": this_week_events
-        }
+        })
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/{user_id}/events")
+@read_only
 async def get_user_events(user_id: str):
     """
     Возвращает список всех мероприятий, в которых участвует пользователь (как участник или организатор).
     """
     try:
-        return await event_service.get_events_for_user(user_id)
+        return ORJSONResponse(await event_service.get_events_for_user(user_id))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -170,11 +198,7 @@ async def update_user_profile_picture(user_id: str, picture_url: str):
     """
     Обновляет URL картинки профиля пользователя.
     """
-    db = await get_db()
-    await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"profile_picture": picture_url}}
-    )
+    await user_service.update_user_profile_picture(user_id, picture_url)
     return {"message": "Фото обновлено"}
 
 
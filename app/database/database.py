@@ -1,13 +1,72 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import settings
-from pymongo import IndexModel, ASCENDING
 from pymongo.errors import CollectionInvalid
+from app.monitoring.mongo import mongo_event_listeners
+from app.monitoring.queries import QueryCountListener
+from app.database.read_routing import DEFAULT_READ_PREFERENCE, current_read_preference
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+from contextlib import asynccontextmanager
 import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 client = None
 db = None
+# Handle базы по режиму чтения; сбрасываются вместе с клиентом
+_read_handles = {}
+
+# MONGODB_URL=mongomock:// - база в памяти процесса (mongomock-motor) для бенчмарков
+# и локальных проверок; aggregation-операторы поддерживаются ею не полностью
+IN_MEMORY_URL_SCHEME = "mongomock://"
+
+
+def client_options() -> dict:
+    """
+    Параметры пула соединений, таймаутов, сжатия и чтения для AsyncIOMotorClient.
+    Значение 0 у maxIdleTimeMS и waitQueueTimeoutMS означает "без ограничения".
+    """
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "readPreference": DEFAULT_READ_PREFERENCE,
+    }
+    if settings.MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = settings.MONGO_MAX_IDLE_TIME_MS
+    if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    compressors = [name.strip() for name in settings.MONGO_COMPRESSORS.split(",") if name.strip()]
+    if compressors:
+        # zstd требует пакет zstandard, snappy - python-snappy
+        options["compressors"] = compressors
+    return options
+
+
+def _create_client():
+    if settings.MONGODB_URL.startswith(IN_MEMORY_URL_SCHEME):
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient()
+    return AsyncIOMotorClient(
+        settings.MONGODB_URL,
+        event_listeners=[*mongo_event_listeners(), QueryCountListener()],
+        **client_options()
+    )
+
+
+async def warm_up_pool(size: int):
+    """
+    Открывает size соединений заранее: одновременные ping заставляют пул
+    создать по соединению на каждый, и первые запросы после деплоя
+    не платят за установку соединения и аутентификацию.
+    """
+    if size <= 0:
+        return
+    started = time.perf_counter()
+    await asyncio.gather(*(db.command("ping") for _ in range(size)))
+    logger.info(f"Warmed up MongoDB pool with {size} connections in {time.perf_counter() - started:.3f}s")
+
 
 async def connect_to_mongo():
     global client, db
@@ -17,17 +76,23 @@ async def connect_to_mongo():
     for attempt in range(max_retries):
         try:
             logger.info(f"Connecting to MongoDB (attempt {attempt+1}/{max_retries})")
-            client = AsyncIOMotorClient(settings.MONGODB_URL)
+            client = _create_client()
             db = client[settings.DB_NAME]
+            _read_handles.clear()
             
             # Проверка соединения
             await db.command('ping')
             logger.info("Successfully connected to MongoDB")
-            
+
+            await warm_up_pool(settings.MONGO_MIN_POOL_SIZE)
             return
             
         except Exception as e:
             logger.error(f"Connection failed: {e}")
+            # Закрываем неудачный клиент, иначе его пул и фоновые потоки мониторинга остаются жить
+            if client is not None:
+                client.close()
+                client, db = None, None
             if attempt < max_retries - 1:
                 logger.info(f"Retrying in {retry_delay} seconds...")
                 await asyncio.sleep(retry_delay)
@@ -40,5 +105,43 @@ async def close_mongo_connection():
         client.close()
         logger.info("MongoDB connection closed")
 
+async def ping_database(timeout: float) -> float:
+    """
+    Выполняет ping и возвращает время ответа в секундах.
+    Если база не ответила за timeout секунд, выбрасывает исключение.
+    """
+    if db is None:
+        raise ConnectionError("Database is not connected")
+    started = time.perf_counter()
+    await asyncio.wait_for(db.command("ping"), timeout=timeout)
+    return time.perf_counter() - started
+
+def _db_with_read_preference(mode: str):
+    handle = _read_handles.get(mode)
+    if handle is None:
+        # Чтение с реплик ограничено по отставанию, для primary ограничение не применяется
+        max_staleness = settings.MONGO_MAX_STALENESS_SECONDS if mode != "primary" and settings.MONGO_MAX_STALENESS_SECONDS else -1
+        handle = _read_handles[mode] = db.with_options(
+            read_preference=make_read_preference(read_pref_mode_from_name(mode), None, max_staleness)
+        )
+    return handle
+
+@asynccontextmanager
+async def causal_session():
+    """
+    Сессия с причинной согласованностью для чтения после записи: операции,
+    выполненные с session=..., видят предыдущие записи этой сессии даже при
+    чтении с реплики. Для базы в памяти сессии нет (None).
+    """
+    if client is None or settings.MONGODB_URL.startswith(IN_MEMORY_URL_SCHEME):
+        yield None
+        return
+    async with await client.start_session(causal_consistency=True) as session:
+        yield session
+
 async def get_db():
-    return db
\ No newline at end of file
+    mode = current_read_preference.get()
+    # База в памяти не поддерживает read preference (with_options возвращает синхронный объект)
+    if mode is None or mode == DEFAULT_READ_PREFERENCE or db is None or settings.MONGODB_URL.startswith(IN_MEMORY_URL_SCHEME):
+        return db
+    return _db_with_read_preference(mode)
\ No newline at end of file
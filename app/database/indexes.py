@@ -0,0 +1,111 @@
+"""
+Декларативный список индексов MongoDB.
+
+Индексы создаются идемпотентно при старте приложения (lifespan в main.py)
+или отдельной командой при деплое:
+
+    python -m app.database.indexes
+"""
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import OperationFailure
+from app.database.database import get_db, connect_to_mongo, close_mongo_connection
+from typing import Dict, List
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # На уникальность email полагается create_user
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # Поиск пользователей в админке (app/services/user_search.py)
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens"),
+        # Сортировка списка пользователей в админке (SORTABLE_FIELDS в admin_service)
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+        IndexModel([("surname", ASCENDING), ("_id", ASCENDING)], name="surname_id"),
+        IndexModel([("email", ASCENDING), ("_id", ASCENDING)], name="email_id"),
+    ],
+    "events": [
+        # Мероприятия сегодня/на неделе и keyset-пагинация GET /api/events/
+        IndexModel([("date", ASCENDING), ("_id", ASCENDING)], name="date_id"),
+        # Мероприятия, которые организует пользователь (get_events_for_user, get_future_events_for_user)
+        IndexModel([("organizers", ASCENDING), ("date", ASCENDING)], name="organizers_date"),
+        # Фильтр по категории в списке мероприятий
+        IndexModel([("category_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)], name="category_date_id"),
+    ],
+    "registrations": [
+        # Повторную запись на мероприятие отклоняет индекс (app/services/registration_service.py)
+        IndexModel([("event_id", ASCENDING), ("user_id", ASCENDING)], name="event_user_unique", unique=True),
+        # Постраничные списки участников и листа ожидания, первый в очереди на освободившееся место
+        IndexModel([("event_id", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)], name="event_status_id"),
+        # Мероприятия, на которые записан пользователь
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_status"),
+    ],
+    "image_blobs": [
+        # Дедупликация загрузок по хешу содержимого (app/services/blob_service.py)
+        IndexModel([("hash", ASCENDING)], name="hash_unique", unique=True),
+        IndexModel([("refcount", ASCENDING), ("updated_at", ASCENDING)], name="refcount_updated"),
+    ],
+}
+
+
+def _same_index(declared: dict, existing: dict) -> bool:
+    return (
+        list(declared["key"].items()) == [tuple(part) for part in existing["key"]]
+        and bool(declared.get("unique")) == bool(existing.get("unique"))
+    )
+
+
+async def sync_indexes() -> bool:
+    """
+    Создает недостающие индексы из INDEXES и логирует расхождения
+    между объявленными и существующими индексами.
+    Существующие индексы не удаляются и не пересоздаются.
+    Возвращает False, если хотя бы один индекс создать не удалось.
+    """
+    db = await get_db()
+    ok = True
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        declared = {model.document["name"]: model for model in models}
+
+        missing = []
+        for name, model in declared.items():
+            if name not in existing:
+                missing.append(model)
+            elif not _same_index(model.document, existing[name]):
+                logger.warning(
+                    f"Index {collection_name}.{name} differs from declaration: "
+                    f"declared {dict(model.document['key'])}, actual {existing[name]}"
+                )
+
+        for name in set(existing) - set(declared) - {"_id_"}:
+            logger.warning(f"Index {collection_name}.{name} is not declared in INDEXES")
+
+        if missing:
+            try:
+                await collection.create_indexes(missing)
+                logger.info(f"Created indexes on {collection_name}: {[m.document['name'] for m in missing]}")
+            except OperationFailure as e:
+                ok = False
+                logger.error(f"Failed to create indexes on {collection_name}: {e}")
+    return ok
+
+
+async def main() -> int:
+    await connect_to_mongo()
+    try:
+        return 0 if await sync_indexes() else 1
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    sys.exit(asyncio.run(main()))
@@ -1,6 +1,11 @@
 from app.database.database import get_db
-from app.schemas.schemas import Role, Status
+from app.schemas.schemas import RegistrationStatus, Role, Status
+from app.services.user_search import build_search_fields, SEARCH_FIELDS
 from bson import ObjectId
+from config import settings
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,4 +38,131 @@ async def init_categories():
             {"_id": ObjectId(), "name": "Митап"},
             {"_id": ObjectId(), "name": "Хакатон"}
         ])
-        logger.info("Created initial categories")
\ No newline at end of file
+        logger.info("Created initial categories")
+
+async def init_user_search_tokens(batch_size: int = 500):
+    """
+    Заполняет search_tokens и search_words у пользователей, созданных до появления
+    поиска по токенам или до появления search_words.
+    """
+    db = await get_db()
+    cursor = db.users.find(
+        {"$or": [{"search_tokens": {"$exists": False}}, {"search_words": {"$exists": False}}]},
+        {field: 1 for field in SEARCH_FIELDS}
+    )
+    updates = []
+    updated = 0
+    async for user in cursor:
+        updates.append(UpdateOne(
+            {"_id": user["_id"]},
+            {"$set": build_search_fields(user)}
+        ))
+        if len(updates) >= batch_size:
+            await db.users.bulk_write(updates, ordered=False)
+            updated += len(updates)
+            updates = []
+    if updates:
+        await db.users.bulk_write(updates, ordered=False)
+        updated += len(updates)
+    if updated:
+        logger.info(f"Built search tokens for {updated} users")
+
+async def migrate_event_participants(batch_size: int = 500):
+    """
+    Переносит массивы events.participants в коллекцию registrations и заполняет
+    participant_count. Выполняется один раз: после успешного переноса в коллекции
+    migrations остается отметка, а пока перенос идет, остальные воркеры его пропускают.
+    """
+    await run_migration("event_participants", _move_event_participants, batch_size)
+
+
+async def run_migration(name: str, migration, *args):
+    """
+    Выполняет migration(*args), если миграция name еще не выполнена и не выполняется
+    другим процессом. Блокировка - документ migrations с _id=name: вставить его может
+    только один воркер. Блокировка старше MIGRATION_LOCK_TIMEOUT_SECONDS считается
+    брошенной (воркер упал) и перехватывается; при ошибке она снимается, и миграция
+    повторится при следующем старте.
+    """
+    db = await get_db()
+    started_at = datetime.utcnow()
+    try:
+        await db.migrations.insert_one({"_id": name, "status": "running", "started_at": started_at})
+    except DuplicateKeyError:
+        stale_before = started_at - timedelta(seconds=settings.MIGRATION_LOCK_TIMEOUT_SECONDS)
+        lock = await db.migrations.find_one_and_update(
+            {"_id": name, "status": "running", "started_at": {"$lt": stale_before}},
+            {"$set": {"started_at": started_at}}
+        )
+        if not lock:
+            logger.info(f"Migration {name} is already done or running, skipped")
+            return
+        logger.warning(f"Migration {name} lock from {lock['started_at']} is stale, taking over")
+
+    try:
+        await migration(*args)
+    except Exception:
+        await db.migrations.delete_one({"_id": name, "started_at": started_at})
+        raise
+    await db.migrations.update_one(
+        {"_id": name},
+        {"$set": {"status": "done", "finished_at": datetime.utcnow()}}
+    )
+
+
+async def _move_event_participants(batch_size: int):
+    # Записи вставляются через upsert, а массив удаляется из мероприятия последним,
+    # поэтому прерванный перенос безопасно повторяется
+    db = await get_db()
+    migrated_events = 0
+    skipped_participants = 0
+    cursor = db.events.find({"participants": {"$exists": True}}, {"participants": 1})
+    async for event in cursor:
+        updates = []
+        for participant in event.get("participants") or []:
+            # ObjectId(None) создал бы новый id, поэтому значения проверяются заранее
+            if not ObjectId.is_valid(participant):
+                logger.warning(f"Event {event['_id']}: skipped invalid participant id {participant!r}")
+                skipped_participants += 1
+                continue
+            user_id = ObjectId(participant)
+            updates.append(UpdateOne(
+                {"event_id": event["_id"], "user_id": user_id},
+                {"$setOnInsert": {
+                    "event_id": event["_id"],
+                    "user_id": user_id,
+                    "status": RegistrationStatus.REGISTERED.value,
+                    "registered_at": None
+                }},
+                upsert=True
+            ))
+            if len(updates) >= batch_size:
+                await db.registrations.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            await db.registrations.bulk_write(updates, ordered=False)
+
+        participant_count = await db.registrations.count_documents({"event_id": event["_id"]})
+        await db.events.update_one(
+            {"_id": event["_id"]},
+            {"$set": {"participant_count": participant_count}, "$unset": {"participants": ""}}
+        )
+        migrated_events += 1
+
+    initialized = await db.events.update_many(
+        {"participant_count": {"$exists": False}},
+        {"$set": {"participant_count": 0}}
+    )
+    # Записи, перенесенные до появления листа ожидания, - участники
+    statuses = await db.registrations.update_many(
+        {"status": {"$exists": False}},
+        {"$set": {"status": RegistrationStatus.REGISTERED.value}}
+    )
+    if migrated_events:
+        logger.info(f"Moved participants of {migrated_events} events to registrations")
+    if skipped_participants:
+        logger.warning(f"Skipped {skipped_participants} invalid participant ids")
+    if initialized.modified_count:
+        logger.info(f"Initialized participant_count for {initialized.modified_count} events")
+    if statuses.modified_count:
+        logger.info(f"Set registration status for {statuses.modified_count} registrations")
@@ -0,0 +1,99 @@
+"""
+Выбор read preference для запроса.
+
+Обработчики, помеченные декоратором @read_only, только читают данные и не
+требуют read-your-writes, поэтому читают с MONGO_READ_ONLY_PREFERENCE
+(по умолчанию secondaryPreferred с ограничением отставания
+MONGO_MAX_STALENESS_SECONDS) - чтение масштабируется добавлением реплик.
+
+MONGO_ROUTE_READ_PREFERENCES - JSON-словарь "шаблон маршрута" -> режим чтения,
+например {"GET /api/events/": "secondaryPreferred", "/api/admins/users": "nearest"}.
+Зависимость select_read_preference подключена ко всему приложению: она находит
+маршрут запроса в словаре и запоминает режим в context variable, а get_db
+возвращает handle базы с этим режимом. Запись в словаре важнее пометки @read_only,
+остальные маршруты читают с MONGO_READ_PREFERENCE. Решение считается в метрике
+mongo_read_routing.
+"""
+from app.monitoring.metrics import registry
+from app.monitoring.middleware import route_template
+from config import settings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import Request
+from typing import Callable, Dict, Optional, Set
+import json
+
+READ_PREFERENCE_MODES = ("primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest")
+
+current_read_preference: ContextVar[Optional[str]] = ContextVar("current_read_preference", default=None)
+
+READ_ONLY_ENDPOINTS: Set[Callable] = set()
+
+mongo_read_routing = registry.counter(
+    "mongo_read_routing",
+    "HTTP requests by route template and the read preference chosen for them",
+    ["route", "read_preference", "source"]
+)
+
+
+def _validate_mode(mode: str, source: str) -> str:
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Invalid read preference {mode!r} in {source}, expected one of {READ_PREFERENCE_MODES}")
+    return mode
+
+
+def parse_route_read_preferences(value: str) -> Dict[str, str]:
+    if not value:
+        return {}
+    routes = json.loads(value)
+    return {route: _validate_mode(mode, "MONGO_ROUTE_READ_PREFERENCES") for route, mode in routes.items()}
+
+
+DEFAULT_READ_PREFERENCE = _validate_mode(settings.MONGO_READ_PREFERENCE, "MONGO_READ_PREFERENCE")
+READ_ONLY_PREFERENCE = _validate_mode(settings.MONGO_READ_ONLY_PREFERENCE, "MONGO_READ_ONLY_PREFERENCE")
+ROUTE_READ_PREFERENCES = parse_route_read_preferences(settings.MONGO_ROUTE_READ_PREFERENCES)
+
+
+def read_preference_for(method: str, route: str) -> Optional[str]:
+    return ROUTE_READ_PREFERENCES.get(f"{method} {route}") or ROUTE_READ_PREFERENCES.get(route)
+
+
+def read_only(endpoint: Callable) -> Callable:
+    """
+    Помечает обработчик как только читающий. Ставится под декоратором маршрута:
+
+        @router.get("/")
+        @read_only
+        async def get_all_events_endpoint(...):
+    """
+    READ_ONLY_ENDPOINTS.add(endpoint)
+    return endpoint
+
+
+async def select_read_preference(request: Request):
+    """
+    Зависимость уровня приложения. Асинхронная, поэтому выполняется в том же
+    контексте, что и обработчик, и выбранный режим виден в get_db. Режим
+    выставляется на каждый запрос, в том числе сбрасывается в None, чтобы не
+    достался следующему запросу в той же задаче (например, в тестах через ASGITransport).
+    """
+    route = route_template(request.scope)
+    mode = read_preference_for(request.method, route) if ROUTE_READ_PREFERENCES else None
+    source = "settings"
+    if mode is None and request.scope.get("endpoint") in READ_ONLY_ENDPOINTS:
+        mode, source = READ_ONLY_PREFERENCE, "read_only"
+    current_read_preference.set(mode)
+    mongo_read_routing.inc(route=route, read_preference=mode or DEFAULT_READ_PREFERENCE, source=source if mode else "default")
+
+
+@contextmanager
+def primary_reads():
+    """
+    Чтение с режимом по умолчанию внутри блока. Нужен для результатов, которые
+    кэшируются и отдаются другим запросам: они не должны собираться с отстающей реплики.
+    """
+    token = current_read_preference.set(None)
+    try:
+        yield
+    finally:
+        current_read_preference.reset(token)
@@ -0,0 +1,31 @@
+"""
+Сборщики, которые выгружают в /metrics статистику, уже накопленную сервисами.
+"""
+from app.monitoring.metrics import registry
+from app.services.password_service import password_hasher
+from app.services.user_cache import user_cache
+
+
+def _password_hashing_metrics():
+    stats = password_hasher.stats()
+    yield "password_hash_workers", "gauge", "Password hashing worker threads", [({}, stats["workers"])]
+    yield "password_hash_running", "gauge", "Password hashes being computed", [({}, stats["running"])]
+    yield "password_hash_waiting", "gauge", "Password hashes waiting for a worker", [({}, stats["waiting"])]
+    yield "password_hash_completed", "counter", "Completed password hashes", [({}, stats["completed"])]
+    yield "password_hash_rejected", "counter", "Password hashes rejected by admission control", [({}, stats["rejected"])]
+    yield "password_hash_busy_seconds", "counter", "Time spent computing password hashes", [({}, stats["busy_seconds"])]
+    yield "password_hash_wait_seconds", "counter", "Time spent waiting for a hashing worker", [({}, stats["wait_seconds"])]
+
+
+def _user_cache_metrics():
+    stats = user_cache.stats()
+    yield "user_cache_entries", "gauge", "User profiles in the in-process cache", [({}, stats["size"])]
+    yield "user_cache_hits", "counter", "User profile cache hits", [({}, stats["hits"])]
+    yield "user_cache_misses", "counter", "User profile cache misses", [({}, stats["misses"])]
+    yield "user_cache_evictions", "counter", "User profiles evicted by the size limit", [({}, stats["evictions"])]
+    yield "user_cache_invalidations", "counter", "User profile invalidations", [({}, stats["invalidations"])]
+
+
+def register_service_collectors():
+    registry.register_collector(_password_hashing_metrics)
+    registry.register_collector(_user_cache_metrics)
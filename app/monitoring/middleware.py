@@ -0,0 +1,121 @@
+"""
+ASGI-middleware с метриками HTTP-запросов.
+
+Метка route - шаблон маршрута (/api/events/{event_id}), а не фактический путь,
+поэтому число временных рядов не растет вместе с числом id.
+"""
+from app.monitoring.metrics import registry
+from app.monitoring.queries import http_request_db_queries, http_requests_n_plus_one, track_queries
+from config import settings
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = "unmatched"
+
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight",
+    "Number of HTTP requests currently being processed",
+    ["method"]
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"]
+)
+http_responses = registry.counter(
+    "http_responses",
+    "HTTP responses by route template and status code",
+    ["method", "route", "status"]
+)
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Шаблон маршрута с префиксом роутера. У маршрутов из include_router шаблон
+    может быть записан без префикса, поэтому префикс восстанавливается по пути:
+    это часть пути перед участком, совпавшим с шаблоном маршрута.
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if not path_format:
+        return UNMATCHED_ROUTE
+    path = scope.get("path", "")
+    params = {name: str(value) for name, value in scope.get("path_params", {}).items()}
+    try:
+        matched = path_format.format(**params)
+    except (KeyError, IndexError, ValueError):
+        return path_format
+    if matched and path.endswith(matched):
+        return path[:len(path) - len(matched)] + path_format
+    return path_format
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Роутер записывает найденный маршрут в scope, так что шаблон известен после обработки
+            route = route_template(scope)
+            http_request_duration.observe(time.perf_counter() - started, method=method, route=route)
+            http_responses.inc(method=method, route=route, status=str(status_code))
+            http_requests_in_flight.dec(method=method)
+
+
+class QueryCountMiddleware:
+    """
+    Считает команды MongoDB каждого запроса, пишет их число в лог и, если включен
+    DB_QUERY_DEBUG, в заголовок X-DB-Queries. Повторяющиеся формы запросов
+    (N+1) попадают в лог как предупреждение.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start" and settings.DB_QUERY_DEBUG:
+                    # Для потоковых ответов это число команд до начала отправки тела
+                    MutableHeaders(scope=message).append("X-DB-Queries", str(stats.count))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                method = scope["method"]
+                route = route_template(scope)
+                http_request_db_queries.observe(stats.count, method=method, route=route)
+                log = logger.info if settings.DB_QUERY_DEBUG else logger.debug
+                log(f"{method} {scope['path']}: {stats.count} MongoDB commands")
+                repeated = stats.repeated(settings.N_PLUS_ONE_THRESHOLD)
+                if repeated:
+                    http_requests_n_plus_one.inc(method=method, route=route)
+                    for shape, count in repeated.items():
+                        logger.warning(f"Possible N+1 in {method} {route}: {count} x {shape}")
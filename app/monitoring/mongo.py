@@ -0,0 +1,133 @@
+"""
+Слушатели событий pymongo: задержка и число команд по коллекциям
+и время ожидания соединения из пула.
+
+Слушатели передаются в AsyncIOMotorClient(event_listeners=...) и вызываются
+синхронно в потоке, выполняющем операцию, поэтому они только обновляют счетчики.
+"""
+from app.monitoring.metrics import registry
+from pymongo import monitoring
+from typing import Dict, Tuple
+import threading
+
+# Служебные команды, у которых первым полем идет не имя коллекции
+_NON_COLLECTION_COMMANDS = {"ping", "hello", "ismaster", "isMaster", "buildInfo", "endSessions", "listCollections"}
+
+mongo_command_duration = registry.histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency by collection and command",
+    ["collection", "command"]
+)
+mongo_commands = registry.counter(
+    "mongo_commands",
+    "MongoDB commands by collection, command and outcome",
+    ["collection", "command", "outcome"]
+)
+mongo_pool_checkout_wait = registry.histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the MongoDB pool",
+    ["address"]
+)
+mongo_pool_checkout_failures = registry.counter(
+    "mongo_pool_checkout_failures",
+    "Failed MongoDB connection checkouts by reason",
+    ["address", "reason"]
+)
+mongo_pool_connections = registry.gauge(
+    "mongo_pool_connections",
+    "Open MongoDB connections",
+    ["address"]
+)
+mongo_pool_checked_out = registry.gauge(
+    "mongo_pool_checked_out_connections",
+    "MongoDB connections currently checked out of the pool",
+    ["address"]
+)
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    """
+    Коллекция, к которой относится команда: для find/insert/aggregate/... это
+    значение первого поля, для getMore - поле collection.
+    """
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    if command_name in _NON_COLLECTION_COMMANDS:
+        return ""
+    value = command.get(command_name)
+    return value if isinstance(value, str) else ""
+
+
+def _address(address) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self):
+        # Имя коллекции есть только в событии started - запоминаем его по request_id
+        self._pending: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        collection = command_collection(event.command_name, event.command)
+        with self._lock:
+            self._pending[(event.request_id, event.operation_id)] = (collection, event.command_name)
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection, command = self._pending.pop(
+                (event.request_id, event.operation_id), ("", event.command_name)
+            )
+        mongo_command_duration.observe(event.duration_micros / 1_000_000, collection=collection, command=command)
+        mongo_commands.inc(collection=collection, command=command, outcome=outcome)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, "failure")
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(address=_address(event.address))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(address=_address(event.address))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        address = _address(event.address)
+        mongo_pool_checkout_failures.inc(address=address, reason=str(event.reason))
+        mongo_pool_checkout_wait.observe(event.duration, address=address)
+
+    def connection_checked_out(self, event):
+        address = _address(event.address)
+        # duration - время от начала checkout до получения соединения (pymongo 4.7+)
+        mongo_pool_checkout_wait.observe(event.duration, address=address)
+        mongo_pool_checked_out.inc(address=address)
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec(address=_address(event.address))
+
+
+def mongo_event_listeners() -> list:
+    return [CommandMetricsListener(), PoolMetricsListener()]
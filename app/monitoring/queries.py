@@ -0,0 +1,119 @@
+"""
+Подсчет команд MongoDB в рамках одного HTTP-запроса.
+
+Middleware создает QueryStats и кладет его в context variable, а слушатель
+команд pymongo добавляет в него каждую команду. Motor выполняет операции
+в пуле потоков с копией контекста вызывающей корутины, поэтому команда
+попадает в статистику того запроса, который ее выполнил.
+
+Команды с одинаковой формой (коллекция, команда и структура фильтра без значений),
+повторенные в одном запросе N_PLUS_ONE_THRESHOLD раз и больше, считаются
+признаком N+1: скорее всего, запрос выполняется в цикле по элементам.
+"""
+from app.monitoring.metrics import registry
+from app.monitoring.mongo import command_collection
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from typing import Dict, Iterator, Optional
+import json
+import threading
+
+# Команды, которые продолжают уже учтенную операцию
+_CONTINUATION_COMMANDS = {"getMore", "killCursors", "endSessions"}
+
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries",
+    "MongoDB commands issued per HTTP request",
+    ["method", "route"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+http_requests_n_plus_one = registry.counter(
+    "http_requests_n_plus_one",
+    "HTTP requests that repeated the same query shape",
+    ["method", "route"]
+)
+
+
+def query_shape(value):
+    """
+    Структура фильтра или pipeline без конкретных значений.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(item, dict) for item in value):
+        return [query_shape(item) for item in value]
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> str:
+    collection = command_collection(command_name, command)
+    if command_name == "find":
+        body = command.get("filter", {})
+    elif command_name == "aggregate":
+        body = command.get("pipeline", [])
+    elif command_name in ("count", "findAndModify", "distinct"):
+        body = command.get("query", {})
+    elif command_name == "update":
+        body = [update.get("q", {}) for update in command.get("updates", [])]
+    elif command_name == "delete":
+        body = [delete.get("q", {}) for delete in command.get("deletes", [])]
+    else:
+        body = None
+    return f"{collection}.{command_name} {json.dumps(query_shape(body), ensure_ascii=False)}"
+
+
+class QueryStats:
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.count = 0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, command_name: str, command: dict, shape: Optional[str] = None):
+        if shape is None and command_name not in _CONTINUATION_COMMANDS:
+            shape = command_shape(command_name, command)
+        with self._lock:
+            self.count += 1
+            if shape is not None:
+                self.shapes[shape] += 1
+        if self.parent is not None:
+            self.parent.record(command_name, command, shape)
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """
+        Формы запросов, выполненные threshold раз и больше.
+        """
+        with self._lock:
+            return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+
+current_queries: ContextVar[Optional[QueryStats]] = ContextVar("current_queries", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Считает команды MongoDB, выполненные внутри блока. Вложенные блоки
+    (например, запрос внутри теста) учитываются и во внешнем.
+    """
+    stats = QueryStats(parent=current_queries.get())
+    token = current_queries.set(stats)
+    try:
+        yield stats
+    finally:
+        current_queries.reset(token)
+
+
+class QueryCountListener(monitoring.CommandListener):
+    def started(self, event: monitoring.CommandStartedEvent):
+        stats = current_queries.get()
+        if stats is not None:
+            stats.record(event.command_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pass
@@ -0,0 +1,48 @@
+"""
+Помощники для тестов: проверка бюджета запросов к MongoDB.
+
+    async def test_event_detail_budget(client):
+        await assert_endpoint_query_budget(client, "GET", f"/api/events/{event_id}", max_queries=1)
+
+    async def test_homepage_has_no_n_plus_one(client):
+        with assert_query_budget(max_queries=4):
+            await client.get(f"/api/users/home/{user_id}")
+
+Клиент должен вызывать приложение в том же процессе (httpx.AsyncClient
+с ASGITransport), иначе команды выполняются вне контекста теста.
+"""
+from app.monitoring.queries import QueryStats, track_queries
+from config import settings
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+@contextmanager
+def assert_query_budget(
+    max_queries: int,
+    allow_repeated: bool = False,
+    repeat_threshold: Optional[int] = None
+) -> Iterator[QueryStats]:
+    """
+    Проверяет, что внутри блока выполнено не больше max_queries команд MongoDB
+    и (если allow_repeated=False) ни одна форма запроса не повторилась
+    repeat_threshold раз (по умолчанию N_PLUS_ONE_THRESHOLD).
+    """
+    threshold = repeat_threshold or settings.N_PLUS_ONE_THRESHOLD
+    with track_queries() as stats:
+        yield stats
+    assert stats.count <= max_queries, (
+        f"Expected at most {max_queries} MongoDB commands, got {stats.count}: {dict(stats.shapes)}"
+    )
+    if not allow_repeated:
+        repeated = stats.repeated(threshold)
+        assert not repeated, f"Repeated query shapes (possible N+1): {repeated}"
+
+
+async def assert_endpoint_query_budget(client, method: str, url: str, max_queries: int, **request_kwargs):
+    """
+    Выполняет запрос и проверяет его бюджет запросов. Возвращает ответ.
+    """
+    with assert_query_budget(max_queries):
+        response = await client.request(method, url, **request_kwargs)
+    return response
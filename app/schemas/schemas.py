@@ -1,9 +1,11 @@
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, PlainSerializer, SerializationInfo
 from datetime import datetime, date
-from typing import Optional, List
+from typing import Annotated, Dict, FrozenSet, Optional, List, Tuple, Type, TypeVar
 from bson import ObjectId
 from pydantic_core import core_schema
 from enum import Enum
+from functools import lru_cache
+from app.services.storage_service import storage
 
 
 class PyObjectId(str):
@@ -33,6 +35,21 @@ class PyObjectId(str):
         return handler(core_schema.str_schema())
 
 
+# Контекст сериализации, в котором ImageRef остается сохраненным значением (ключом)
+STORED_IMAGES_CONTEXT = {"stored_images": True}
+
+
+def _serialize_image_ref(value: str, info: SerializationInfo) -> Optional[str]:
+    if info.context and info.context.get("stored_images"):
+        return value
+    return storage.resolve_url(value)
+
+
+# В базе хранится ключ объекта в хранилище (или внешняя ссылка),
+# а в ответ отдается подписанная ссылка из кэша storage
+ImageRef = Annotated[str, PlainSerializer(_serialize_image_ref, return_type=Optional[str])]
+
+
 class Role(str, Enum):
     USER = "user"
     ORGANIZER = "organizer"
@@ -79,6 +96,11 @@ class Status(str, Enum):
     CANCELLED = "cancelled"
 
 
+class RegistrationStatus(str, Enum):
+    REGISTERED = "registered"
+    WAITLISTED = "waitlisted"
+
+
 class UserBase(BaseModel):
     name: str
     surname: str
@@ -117,7 +139,7 @@ class User(UserBase):
     events_organized: int = 0
     is_active: bool = True
     phone_number: Optional[str] = None
-    profile_picture: Optional[str]=None
+    profile_picture: Optional[ImageRef]=None
 
     model_config = ConfigDict(
         json_encoders={ObjectId: str},
@@ -154,6 +176,8 @@ class EventCreate(EventBase):
     description: str
     age_limit: str
     for_roles: List[str]
+    # None - без ограничения числа участников
+    capacity: Optional[int] = Field(None, ge=1)
     model_config = ConfigDict(
         json_schema_extra={
             "example": {
@@ -164,7 +188,8 @@ class EventCreate(EventBase):
                 "photos": ["https://synergy.ru/assets/upload/news/pr/whatsapp_image_2021_09_07_at_14.05.01.jpeg"],
                 "description": "lalalaalalallaalalalal",
                 "age_limit": "16+",
-                "for_roles": ["Школьник"]
+                "for_roles": ["Школьник"],
+                "capacity": 100
             }
         }
     )
@@ -172,10 +197,12 @@ class EventCreate(EventBase):
 
 class Event(EventBase):
     id: PyObjectId = Field(alias="_id")
-    participants: List[PyObjectId] = []
+    participant_count: int = 0
+    capacity: Optional[int] = None
+    waitlist_count: int = 0
     organizers: str=""
     status: Status = Status.PLANNED
-    photos: List[str] 
+    photos: List[ImageRef] 
     description: str
     age_limit: str
     for_roles: List[str]
@@ -188,7 +215,9 @@ class Event(EventBase):
                 "id": "507f1f77bcf86cd799439012",
                 "name": "Конференция по Python",
                 "date": "2023-12-15T10:00:00",
-                "participants": ["307f1f77bcf86cd799439012", "407f1f77bcf86cd799439012"],
+                "participant_count": 2,
+                "capacity": 100,
+                "waitlist_count": 0,
                 "organizer": ["707f1f77bcf86cd799439012", "507f1f77bcf86cd799439012"],
                 "location": "Москва, ул. Пушкина 10",
                 "category_id": "683f4cddbb8b713c343f0913",
@@ -196,4 +225,51 @@ class Event(EventBase):
                 "photos": []
             }
         }
-    )
\ No newline at end of file
+    )
+
+
+class EventPage(BaseModel):
+    events: List[Event]
+    next_cursor: Optional[str] = None
+
+
+class Participant(BaseModel):
+    user_id: PyObjectId
+    registered_at: Optional[datetime] = None
+
+
+class ParticipantPage(BaseModel):
+    participants: List[Participant]
+    next_cursor: Optional[str] = None
+
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+@lru_cache(maxsize=None)
+def _document_layout(model: Type[BaseModel]) -> Tuple[FrozenSet[str], Dict[str, Type[Enum]]]:
+    required = frozenset(
+        field.alias or name for name, field in model.model_fields.items() if field.is_required()
+    )
+    enums = {
+        field.alias or name: field.annotation
+        for name, field in model.model_fields.items()
+        if isinstance(field.annotation, type) and issubclass(field.annotation, Enum)
+    }
+    return required, enums
+
+
+def from_document(model: Type[ModelT], document: dict) -> ModelT:
+    """
+    Собирает модель из документа, который записало само приложение, без повторной
+    валидации (model_construct): id уже приведены к строкам, типы совпадают со схемой.
+    Документ без обязательных полей проходит обычную валидацию, поэтому ошибки
+    для старых или поврежденных данных остаются прежними.
+    """
+    required, enums = _document_layout(model)
+    if not required.issubset(document):
+        return model.model_validate(document)
+    for key, enum in enums.items():
+        if key in document:
+            document[key] = enum(document[key])
+    return model.model_construct(**document)
@@ -1,5 +1,6 @@
 from app.database.database import get_db
 from app.schemas.schemas import Achievement
+from app.services.user_cache import invalidate_user
 from bson import ObjectId
 from fastapi import HTTPException
 
@@ -26,6 +27,7 @@ async def grant_achievement(user_id: str, achievement_id: str):
         {"_id": ObjectId(user_id)},
         {"$addToSet": {"achievements": ObjectId(achievement_id)}}
     )
+    await invalidate_user(user_id)
 
     if update_result.modified_count == 0:
         print("Achievement already granted to user (or no user/achievement found)")
@@ -1,6 +1,13 @@
 from app.database.database import get_db
 from bson import ObjectId
 from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from config import settings
+from app.services.user_search import search_filter, relevance_expression
+from app.services.user_cache import invalidate_user
+from app.services.pagination import encode_cursor, decode_cursor, keyset_condition
+from app.services.storage_service import storage
+import json
 from app.schemas.schemas import User, Event, Achievement
 
 async def deactivate_user(user_id: str):
@@ -9,6 +16,7 @@ async def deactivate_user(user_id: str):
         {"_id": ObjectId(user_id)},
         {"$set": {"is_active": False}}
     )
+    await invalidate_user(user_id)
     return result.modified_count > 0
 
 async def activate_user(user_id: str):
@@ -17,8 +25,20 @@ async def activate_user(user_id: str):
         {"_id": ObjectId(user_id)},
         {"$set": {"is_active": True}}
     )
+    await invalidate_user(user_id)
     return result.modified_count > 0
 
+# Поля, по которым разрешена сортировка, и поля в базе, которые за ними стоят.
+# Для каждого есть индекс в app/database/indexes.py; created_at берется из _id.
+SORTABLE_FIELDS = {
+    "created_at": "_id",
+    "_id": "_id",
+    "email": "email",
+    "name": "name",
+    "surname": "surname",
+}
+
+
 async def get_users_with_filters(
     page: int = 1,
     limit: int = 10,
@@ -26,38 +46,138 @@ async def get_users_with_filters(
     sort_order: int = -1,
     search: str = None,
     user_type: str = None,
+    is_active: bool = None,
+    cursor: str = None,
+    estimated_total: bool = False
+):
+    """
+    Возвращает страницу пользователей и общее количество за один запрос ($facet).
+    Если передан cursor (next_cursor из прошлого ответа), вместо skip используется
+    keyset-пагинация по (sort_by, _id); сортировка по релевантности в этом режиме не применяется.
+    estimated_total=True без фильтров берет total из метаданных коллекции.
+    """
+    db = await get_db()
+    sort_field = resolve_sort_field(sort_by)
+    sort_order = 1 if sort_order >= 0 else -1
+    sort = {sort_field: sort_order}
+    if sort_field != "_id":
+        sort["_id"] = sort_order
+    query = _build_users_query(search, user_type, is_active)
+
+    items = []
+    if cursor:
+        items.append({"$match": _cursor_condition(cursor, sort_field, sort_order)})
+    else:
+        items.append({"$skip": (page - 1) * limit})
+    # Берем на один документ больше, чтобы понять, есть ли следующая страница
+    items.append({"$limit": limit + 1})
+    items.append({"$project": {"password": 0, "search_tokens": 0, "search_words": 0, "_relevance": 0}})
+
+    pipeline = [{"$match": query}]
+    by_relevance = bool(search) and not cursor
+    if by_relevance:
+        # Сначала самые релевантные совпадения, затем обычная сортировка
+        pipeline.append({"$addFields": {"_relevance": relevance_expression(search)}})
+        pipeline.append({"$sort": {"_relevance": -1, **sort}})
+    else:
+        pipeline.append({"$sort": sort})
+
+    if estimated_total and not query:
+        users = await db.users.aggregate(pipeline + items).to_list(length=None)
+        total = await db.users.estimated_document_count()
+    else:
+        pipeline.append({"$facet": {"users": items, "total": [{"$count": "count"}]}})
+        result = await db.users.aggregate(pipeline).to_list(length=1)
+        facet = result[0] if result else {"users": [], "total": []}
+        users = facet["users"]
+        total = facet["total"][0]["count"] if facet["total"] else 0
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        if not by_relevance:
+            last = users[-1]
+            next_cursor = encode_cursor({"value": last.get(sort_field), "_id": last["_id"]})
+
+    # Преобразование ObjectId в строки и ключей изображений в ссылки
+    for user in users:
+        _format_user(user)
+
+    return {
+        "users": users,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "next_cursor": next_cursor
+    }
+
+
+def resolve_sort_field(sort_by: str) -> str:
+    """
+    Поле MongoDB для параметра sort_by. Выбрасывает HTTPException 400 для
+    неизвестного поля, поэтому выгрузка вызывает его до начала потокового ответа.
+    """
+    if sort_by not in SORTABLE_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Sorting is allowed only by: {', '.join(SORTABLE_FIELDS)}"
+        )
+    return SORTABLE_FIELDS[sort_by]
+
+
+def _cursor_condition(cursor: str, sort_field: str, sort_order: int) -> dict:
+    position = decode_cursor(cursor)
+    if "value" not in position or not isinstance(position.get("_id"), ObjectId):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if sort_field == "_id":
+        return {"_id": {"$gt" if sort_order == 1 else "$lt": position["_id"]}}
+    return keyset_condition(sort_field, position["value"], position["_id"], sort_order)
+
+
+async def stream_users(
+    sort_field: str = "_id",
+    sort_order: int = -1,
+    search: str = None,
+    user_type: str = None,
     is_active: bool = None
 ):
+    """
+    Асинхронный генератор строк NDJSON с пользователями, подходящими под фильтры.
+    Документы читаются из курсора пачками по EXPORT_BATCH_SIZE, пароли в выгрузку не попадают.
+    sort_field - уже проверенное поле из resolve_sort_field: после первой строки
+    ответ 200 уже отправлен, и ошибку параметров вернуть нельзя.
+    """
     db = await get_db()
-    skip = (page - 1) * limit
+    sort_order = 1 if sort_order >= 0 else -1
+    query = _build_users_query(search, user_type, is_active)
+    cursor = db.users.find(query, {"password": 0, "search_tokens": 0, "search_words": 0}, batch_size=settings.EXPORT_BATCH_SIZE).sort(sort_field, sort_order)
+    async for user in cursor:
+        _format_user(user)
+        yield json.dumps(jsonable_encoder(user), ensure_ascii=False) + "\n"
+
+
+def _build_users_query(search: str = None, user_type: str = None, is_active: bool = None) -> dict:
     query = {}
     
     if search:
-        query["$or"] = [
-            {"first_name": {"$regex": search, "$options": "i"}},
-            {"last_name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}}
-        ]
+        query.update(search_filter(search))
     
     if user_type:
         query["user_type"] = user_type
     
     if is_active is not None:
         query["is_active"] = is_active
-    
-    users = await db.users.find(query).sort(sort_by, sort_order).skip(skip).limit(limit).to_list(limit)
-    
-    # Преобразование ObjectId в строки
-    for user in users:
-        user["_id"] = str(user["_id"])
-        user["achievements"] = [str(a) for a in user.get("achievements", [])]
-        user["favorite_events"] = [str(e) for e in user.get("favorite_events", [])]
-        user["friends"] = [str(f) for f in user.get("friends", [])]
-    
-    total = await db.users.count_documents(query)
-    return {
-        "users": users,
-        "total": total,
-        "page": page,
-        "limit": limit
-    }
\ No newline at end of file
+
+    return query
+
+
+def _format_user(user: dict):
+    """
+    Приводит документ к виду ответа: id - строки, фото профиля - ссылка (как в User).
+    """
+    user["_id"] = str(user["_id"])
+    user["achievements"] = [str(a) for a in user.get("achievements", [])]
+    user["favorite_events"] = [str(e) for e in user.get("favorite_events", [])]
+    user["friends"] = [str(f) for f in user.get("friends", [])]
+    if user.get("profile_picture"):
+        user["profile_picture"] = storage.resolve_url(user["profile_picture"])
@@ -0,0 +1,134 @@
+"""
+Индекс загруженных изображений по хешу содержимого (коллекция image_blobs).
+
+Одинаковые файлы хранятся в хранилище один раз под ключом, построенным из
+sha256. Для каждого объекта считается количество ссылок (refcount) из
+документов (фото профиля, фото мероприятий), чтобы неиспользуемые объекты
+можно было удалить сборщиком мусора. Сама загрузка ссылкой не считается:
+refcount меняет update_blob_references там, где ссылка записывается или удаляется.
+"""
+from app.database.database import get_db
+from app.services.storage_service import storage, digest_from_key
+from collections import Counter
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+
+def blob_key(digest: str, extension: str) -> str:
+    return f"images/{digest}.{extension}"
+
+
+def variant_key(digest: str, name: str, extension: str) -> str:
+    return f"images/{digest}/{name}.{extension}"
+
+
+async def touch_blob(digest: str) -> Optional[dict]:
+    """
+    Обновляет updated_at уже сохраненного объекта и возвращает его описание:
+    повторно загруженный файл получает новый grace period сборщика мусора.
+    Возвращает None, если объекта с таким хешем еще нет.
+    """
+    db = await get_db()
+    return await db.image_blobs.find_one_and_update(
+        {"hash": digest},
+        {"$set": {"updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def register_blob(digest: str, key: str, content_type: str, size: int, variants: Dict[str, str]) -> dict:
+    """
+    Сохраняет описание только что загруженного объекта с refcount = 0.
+    Если тот же файл параллельно загрузил другой запрос, возвращает его запись.
+    """
+    db = await get_db()
+    now = datetime.utcnow()
+    blob = {
+        "hash": digest,
+        "key": key,
+        "content_type": content_type,
+        "size": size,
+        "variants": variants,
+        "refcount": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        await db.image_blobs.insert_one(blob)
+        return blob
+    except DuplicateKeyError:
+        return await touch_blob(digest)
+
+
+async def find_blob_by_key(key: str) -> Optional[dict]:
+    """
+    Возвращает описание объекта, если key - ключ его оригинала или одного из вариантов.
+    Для ключей вне images/ и неизвестных объектов возвращает None.
+    """
+    digest = digest_from_key(key)
+    if not digest:
+        return None
+    db = await get_db()
+    blob = await db.image_blobs.find_one({"hash": digest}, {"key": 1, "variants": 1})
+    if not blob or (key != blob["key"] and key not in blob.get("variants", {}).values()):
+        return None
+    return blob
+
+
+async def to_stored_image(value: str) -> str:
+    """
+    Значение изображения для сохранения в документе: ключ известного объекта
+    из image_blobs или внешняя ссылка. Любой другой ключ хранилища отклоняется
+    с 400, иначе по нему потом подписывались бы ссылки на чужие объекты бакета.
+    """
+    key = storage.object_key(value)
+    if key is None:
+        return value
+    if not await find_blob_by_key(key):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown image")
+    return key
+
+
+def _blob_digests(values: Iterable[Optional[str]]) -> Counter:
+    digests = (digest_from_key(storage.object_key(value)) for value in values if value)
+    return Counter(digest for digest in digests if digest)
+
+
+async def update_blob_references(old_values: Iterable[Optional[str]], new_values: Iterable[Optional[str]]):
+    """
+    Переносит ссылки документа со старых сохраненных значений (ключей, ссылок) на
+    новые: refcount объектов, на которые стало больше ссылок, увеличивается, тех,
+    на которые ссылок стало меньше, - уменьшается. Оригинал и его варианты - один
+    объект, внешние ссылки не учитываются. Вызывается после успешной записи документа.
+    """
+    old, new = _blob_digests(old_values), _blob_digests(new_values)
+    if old == new:
+        return
+    db = await get_db()
+    now = datetime.utcnow()
+    # Сначала добавляем ссылки, затем убираем, чтобы объект не проходил через refcount = 0
+    for digest, count in (new - old).items():
+        await db.image_blobs.update_one(
+            {"hash": digest},
+            {"$inc": {"refcount": count}, "$set": {"updated_at": now}}
+        )
+    for digest, count in (old - new).items():
+        await db.image_blobs.update_one(
+            {"hash": digest, "refcount": {"$gte": count}},
+            {"$inc": {"refcount": -count}, "$set": {"updated_at": now}}
+        )
+
+
+async def find_unreferenced_blobs(grace_period: timedelta = timedelta(days=1), limit: int = 1000) -> List[dict]:
+    """
+    Возвращает объекты без ссылок, которые не менялись дольше grace_period, -
+    кандидатов на удаление из хранилища.
+    """
+    db = await get_db()
+    return await db.image_blobs.find({
+        "refcount": {"$lte": 0},
+        "updated_at": {"$lt": datetime.utcnow() - grace_period}
+    }).to_list(length=limit)
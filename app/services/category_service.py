@@ -1,25 +1,62 @@
-from app.database.database import get_db
-from bson import ObjectId
+from app.database.database import get_db, causal_session
+from app.database.read_routing import primary_reads
 from fastapi import HTTPException, status
 from app.schemas.schemas import Category
+from config import settings
+from typing import Dict, List, Optional
+import asyncio
+import time
 
-async def get_category_by_id(category_id: str) -> str:
-    db = await get_db()
-    category = await db.categories.find_one({"_id": ObjectId(category_id)})
-    return category["name"] if category else 'Нет'
+
+class CategoryRegistry:
+    """
+    Кэш категорий в памяти процесса.
+    Коллекция categories маленькая, поэтому она загружается целиком
+    и перечитывается не чаще, чем раз в CATEGORY_CACHE_TTL секунд.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._names: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            # Другая корутина могла обновить кэш, пока мы ждали блокировку
+            if self._is_fresh():
+                return
+            # Кэш общий для всех запросов - читаем не с реплики
+            with primary_reads():
+                db = await get_db()
+            categories = await db.categories.find().to_list(length=None)
+            self._names = {str(category["_id"]): category["name"] for category in categories}
+            self._loaded_at = time.monotonic()
+
+    async def get_all(self) -> List[Category]:
+        await self._ensure_loaded()
+        return [Category(_id=category_id, name=name) for category_id, name in self._names.items()]
+
+    def put(self, category_id: str, name: str):
+        self._names[str(category_id)] = name
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+category_registry = CategoryRegistry(ttl=settings.CATEGORY_CACHE_TTL)
 
 
 async def get_all_categories():
     """
     Возвращает список всех категорий.
     """
-    db = await get_db()
-    categories = await db.categories.find().to_list(length=None)
-    formatted_categories = []
-    for category in categories:
-        category["_id"] = str(category["_id"])
-        formatted_categories.append(Category(**category))
-    return formatted_categories
+    return await category_registry.get_all()
 
 async def create_category(name: str):
     """
@@ -27,19 +64,9 @@ async def create_category(name: str):
     """
     db = await get_db()
     category = {"name": name}
-    result = await db.categories.insert_one(category)
-    created_category = await db.categories.find_one({"_id": result.inserted_id})
+    async with causal_session() as session:
+        result = await db.categories.insert_one(category, session=session)
+        created_category = await db.categories.find_one({"_id": result.inserted_id}, session=session)
     created_category["_id"] = str(created_category["_id"])
+    category_registry.put(created_category["_id"], created_category["name"])
     return Category(**created_category)
-
-async def get_all_categories():
-    """
-    Возвращает список всех категорий.
-    """
-    db = await get_db()
-    categories = await db.categories.find().to_list(length=None)
-    formatted_categories = []
-    for category in categories:
-        category["_id"] = str(category["_id"])
-        formatted_categories.append(Category(**category))
-    return formatted_categories
\ No newline at end of file
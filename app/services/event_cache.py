@@ -0,0 +1,86 @@
+from app.database.read_routing import primary_reads
+from config import settings
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+
+
+class TimeBucketCache:
+    """
+    Кэш списков мероприятий, одинаковых для всех пользователей (сегодня, эта неделя).
+    Значение живет не дольше ttl секунд и не дольше конца своего временного окна
+    (bucket_end). invalidate() при изменении мероприятий сбрасывает кэш только
+    этого воркера, поэтому остальные воркеры видят изменения не позже чем через ttl.
+    Изменение счетчиков участников
+    (counters_changed) не сбрасывает кэш: затронутое окно доживает не дольше
+    counter_ttl секунд, а окна, в которые мероприятие не попадает, не трогаются.
+    """
+
+    def __init__(self, ttl: int, counter_ttl: int):
+        self._ttl = ttl
+        self._counter_ttl = counter_ttl
+        self._entries: Dict[str, Tuple[datetime, Any]] = {}
+        self._windows: Dict[str, Tuple[datetime, datetime]] = {}
+        self._counter_changes: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._generation = 0
+
+    def _get_fresh(self, key: str):
+        entry = self._entries.get(key)
+        if entry and datetime.now() < entry[0]:
+            return entry
+        return None
+
+    async def get_or_compute(
+        self,
+        key: str,
+        bucket_start: datetime,
+        bucket_end: datetime,
+        compute: Callable[[], Awaitable[Any]]
+    ):
+        entry = self._get_fresh(key)
+        if entry:
+            return entry[1]
+
+        # Один запрос в базу на окно: остальные корутины ждут, пока первая заполнит кэш
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._get_fresh(key)
+            if entry:
+                return entry[1]
+            self._windows[key] = (bucket_start, bucket_end)
+            generation = self._generation
+            counter_changes = self._counter_changes.get(key, 0)
+            # Результат увидят все пользователи до конца окна - читаем его не с реплики
+            with primary_reads():
+                value = await compute()
+            # Не сохраняем результат, посчитанный до invalidate()
+            if generation == self._generation:
+                expires_at = min(bucket_end, datetime.now() + timedelta(seconds=self._ttl))
+                # Счетчики могли измениться во время чтения - такой результат живет недолго
+                if self._counter_changes.get(key, 0) != counter_changes:
+                    expires_at = min(bucket_end, datetime.now() + timedelta(seconds=self._counter_ttl))
+                self._entries[key] = (expires_at, value)
+            return value
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def counters_changed(self, event_date: Optional[datetime]):
+        """
+        Отмечает изменение participant_count/waitlist_count мероприятия с датой event_date.
+        """
+        if event_date is None:
+            return
+        deadline = datetime.now() + timedelta(seconds=self._counter_ttl)
+        for key, (bucket_start, bucket_end) in self._windows.items():
+            if not bucket_start <= event_date < bucket_end:
+                continue
+            self._counter_changes[key] = self._counter_changes.get(key, 0) + 1
+            entry = self._entries.get(key)
+            if entry and entry[0] > deadline:
+                self._entries[key] = (deadline, entry[1])
+
+
+shared_event_lists = TimeBucketCache(settings.EVENT_LIST_CACHE_TTL, settings.EVENT_LIST_COUNTER_TTL)
@@ -1,10 +1,15 @@
-from app.schemas.schemas import Event, EventCreate, Status, User, Category
-from app.database.database import get_db
+from app.schemas.schemas import Event, EventCreate, Status, User, Category, from_document
+from app.database.database import get_db, causal_session
 from bson import ObjectId
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
-from app.schemas.schemas import Event
-from app.services.category_service import get_category_by_id
+from app.services.event_cache import shared_event_lists
+from config import settings
+from app.services.storage_service import storage
+from app.services.blob_service import update_blob_references, to_stored_image
+from app.services.user_cache import invalidate_user
+from app.services.pagination import encode_cursor, decode_cursor, keyset_condition
+from app.services.registration_service import register_participant, registered_event_ids, REGISTERED
 
 
 async def create_event(event_data: EventCreate, organizer_id: str):
@@ -13,75 +18,58 @@ async def create_event(event_data: EventCreate, organizer_id: str):
 
     event_dict.update({
         "organizers": organizer_id,  
-        "status": Status.PLANNED.value
+        "status": Status.PLANNED.value,
+        "participant_count": 0,
+        "waitlist_count": 0,
+        "photos": [await to_stored_image(photo) for photo in event_dict["photos"]]
     })
 
-    result = await db.events.insert_one(event_dict)
+    async with causal_session() as session:
+        result = await db.events.insert_one(event_dict, session=session)
+        shared_event_lists.invalidate()
+        await update_blob_references([], event_dict["photos"])
 
-    await db.users.update_one(
-        {"_id": organizer_id},  
-        {"$inc": {"events_organized": 1}}
-    )
-
-    return await get_full_info_about_event(str(result.inserted_id))
+        await db.users.update_one(
+            {"_id": organizer_id},  
+            {"$inc": {"events_organized": 1}},
+            session=session
+        )
+        await invalidate_user(organizer_id)
 
+        return await get_full_info_about_event(str(result.inserted_id), session=session)
 
-async def get_full_info_about_event(event_id: str) -> Event:
-    db = await get_db()
 
-    # Получаем событие из базы
-    event = await db.events.find_one({"_id": ObjectId(event_id)})
-    if not event:
+async def get_full_info_about_event(event_id: str, session=None) -> Event:
+    events = await _aggregate_events(
+        build_event_pipeline({"_id": ObjectId(event_id)}, organizer_info=True),
+        session=session
+    )
+    if not events:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
-    try:
-        validated_event = await validate_event(event)
-        event_dict = validated_event.model_dump() 
-        event_dict.update({
-            "organizers": await get_user_info_string(event_dict["organizers"]),  
-    })
-        return(event_dict)
-    except HTTPException as e:
-        print(f"Skipping event {event.get('_id')}: {e.detail}") # Логируем факт пропуска события
+    return events[0]
 
 
 async def add_participant(event_id: str, user_id: str):
     db = await get_db()
-    await db.events.update_one(
-        {"_id": ObjectId(event_id)},
-        {"$addToSet": {"participants": ObjectId(user_id)}}
-    )
+    if await register_participant(event_id, user_id) != REGISTERED:
+        return
 
     await db.users.update_one(
         {"_id": ObjectId(user_id)},
         {"$inc": {"events_attended": 1}}
     )
+    await invalidate_user(user_id)
 
 async def get_events_for_user(user_id: str):
     """
     Возвращает список всех мероприятий, в которых участвует пользователь (как участник или организатор).
     """
-    db = await get_db()
-
-    # Find events where user is a participant
-    participant_events = await db.events.find({"participants": ObjectId(user_id)}).to_list(length=None)
-
-    # Find events where user is an organizer
-    organizer_events = await db.events.find({"organizers": user_id}).to_list(length=None)
-
-    # Combine events and remove duplicates (if any)
-    all_events = participant_events + organizer_events
-    unique_event_ids = []
-    unique_events = []
-    for event in all_events:
-        if str(event["_id"]) not in unique_event_ids:
-            unique_event_ids.append(str(event["_id"]))
-            try:
-                validated_event = await validate_event(event)
-                unique_events.append(validated_event)
-            except HTTPException as e:
-                print(f"Skipping event {event.get('_id')}: {e.detail}") # Логируем факт пропуска события
-                continue #Пропускаем событие
-    return unique_events
+    return await _aggregate_events(build_event_pipeline({
+        "$or": [
+            {"_id": {"$in": await registered_event_ids(user_id)}},
+            {"organizers": user_id}
+        ]
+    }))
 
 
 async def get_favorite_events(user_id: str):
@@ -89,21 +77,16 @@ async def get_favorite_events(user_id: str):
     Возвращает список любимых мероприятий пользователя.
     """
     db = await get_db()
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"favorite_events": 1})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    favorite_event_ids = user.get("favorite_events", [])
-    favorite_events = []
-    for event_id in favorite_event_ids:
-        event = await db.events.find_one({"_id": ObjectId(event_id)})
-        if event:
-            try:
-                validated_event = await validate_event(event)
-                favorite_events.append(validated_event)
-            except HTTPException as e:
-                print(f"Skipping event {event.get('_id')}: {e.detail}") # Логируем факт пропуска события
-                continue #Пропускаем событие
-    return favorite_events
+    favorite_event_ids = [ObjectId(event_id) for event_id in user.get("favorite_events", [])]
+    if not favorite_event_ids:
+        return []
+    events = await _aggregate_events(build_event_pipeline({"_id": {"$in": favorite_event_ids}}))
+    # Сохраняем порядок, в котором мероприятия добавлялись в избранное
+    events_by_id = {event.id: event for event in events}
+    return [events_by_id[str(event_id)] for event_id in favorite_event_ids if str(event_id) in events_by_id]
 
 
 async def get_future_events_for_user(user_id: str):
@@ -112,81 +95,51 @@ async def get_future_events_for_user(user_id: str):
     участником или организатором.  Будущие мероприятия - это мероприятия,
     дата которых больше текущей даты.
     """
-    db = await get_db()
     now = datetime.utcnow()  
 
-    events = await db.events.find({
+    return await _aggregate_events(build_event_pipeline({
         "$or": [
-            {"participants": ObjectId(user_id)},
+            {"_id": {"$in": await registered_event_ids(user_id)}},
             {"organizers": user_id}
         ],
         "date": {"$gte": now} 
-    }).to_list(length=None)
-
-    formatted_events =[]
-    for event in events:
-        try:
-            validated_event = await validate_event(event)
-            formatted_events.append(validated_event)
-        except HTTPException as e:
-            print(f"Skipping event {event.get('_id')}: {e.detail}")  # Логируем
-            continue
-        except Exception as e:
-            print(f"Skipping event {event.get('_id')}: {e}")  # Логируем
-            continue
-    return formatted_events
+    }))
 
 async def get_today_events():
     """
     Возвращает список мероприятий, запланированных на сегодня.
+    Список общий для всех пользователей и кэшируется на EVENT_LIST_CACHE_TTL (не дольше конца дня).
     """
-    db = await get_db()
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     tomorrow = today + timedelta(days=1)
 
-    events = await db.events.find({
-        "date": {"$gte": today, "$lt": tomorrow}
-    }).to_list(length=None)
-
-    formatted_events = []
-    for event in events:
-        try:
-            validated_event = await validate_event(event)
-            formatted_events.append(validated_event)
-        except HTTPException as e:
-            print(f"Skipping event {event.get('_id')}: {e.detail}") # Логируем факт пропуска события
-            continue #Пропускаем событие
-        except Exception as e:
-             print(f"Skipping event {event.get('_id')}: {e}") # Логируем факт пропуска события
-             continue
-    return formatted_events
+    return await shared_event_lists.get_or_compute(
+        "today",
+        today,
+        tomorrow,
+        lambda: _aggregate_events(build_event_pipeline({
+            "date": {"$gte": today, "$lt": tomorrow}
+        }))
+    )
 
 
 async def get_this_week_events():
     """
     Возвращает список мероприятий, запланированных на этой неделе (с понедельника по воскресенье).
+    Список общий для всех пользователей и кэшируется на EVENT_LIST_CACHE_TTL (не дольше конца недели).
     """
-    db = await get_db()
-    today = datetime.now()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     start_of_week = today - timedelta(days=today.weekday())  # Monday
     end_of_week = start_of_week + timedelta(days=7)  # Next Monday
 
-    events = await db.events.find({
-        "date": {"$gte": start_of_week, "$lt": end_of_week}
-    }).to_list(length=None)
-
-    formatted_events = []
-    for event in events:
-        try:
-            validated_event = await validate_event(event)
-            formatted_events.append(validated_event)
-        except HTTPException as e:
-            print(f"Skipping event {event.get('_id')}: {e.detail}") # Логируем факт пропуска события
-            continue #Пропускаем событие
-        except Exception as e:
-             print(f"Skipping event {event.get('_id')}: {e}") # Логируем факт пропуска события
-             continue
-    return formatted_events
+    return await shared_event_lists.get_or_compute(
+        "this_week",
+        start_of_week,
+        end_of_week,
+        lambda: _aggregate_events(build_event_pipeline({
+            "date": {"$gte": start_of_week, "$lt": end_of_week}
+        }))
+    )
 
 async def add_event_to_favorites(user_id: str, event_id: str):
     """
@@ -209,6 +162,7 @@ async def add_event_to_favorites(user_id: str, event_id: str):
         {"_id": ObjectId(user_id)},
         {"$addToSet": {"favorite_events": ObjectId(event_id)}}
     )
+    await invalidate_user(user_id)
     return True
 
 async def update_event_picture(event_id: str, event_picture_url: str):
@@ -216,28 +170,214 @@ async def update_event_picture(event_id: str, event_picture_url: str):
     Обновляет URL картинки мероприятия.
     """
     db = await get_db()
-    event = await db.events.find_one({"_id": ObjectId(event_id)})
-    new_photos=event["photos"]
-    new_photos[0]=event_picture_url
+    event = await db.events.find_one({"_id": ObjectId(event_id)}, {"photos": 1})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    new_photos = list(event.get("photos", []))
+    old_photo = new_photos[0] if new_photos else None
+    new_photo = await to_stored_image(event_picture_url)
+    if new_photos:
+        new_photos[0] = new_photo
+    else:
+        new_photos.append(new_photo)
     result = await db.events.update_one(
         {"_id": ObjectId(event_id)},
         {"$set": {"photos": new_photos}}
     )
-    if result.modified_count == 0:
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Event not found")
-    return {"_id":event_id, "photos": new_photos}
+    await update_blob_references([old_photo], [new_photo])
+    shared_event_lists.invalidate()
+    return {"_id":event_id, "photos": [storage.resolve_url(photo) for photo in new_photos]}
     
 async def get_all_events():
     """
     Возвращает список всех мероприятий.
     """
+    return await _aggregate_events(build_event_pipeline())
+
+
+async def get_events_page(
+    limit: int = 20,
+    cursor: str = None,
+    category_id: str = None,
+    event_status: Status = None,
+    date_from: datetime = None,
+    date_to: datetime = None
+) -> dict:
+    """
+    Возвращает страницу мероприятий, отсортированных по (date, _id).
+    Вместо skip используется курсор на последний элемент предыдущей страницы,
+    поэтому стоимость запроса не зависит от номера страницы.
+    """
+    conditions = _build_event_filters(category_id, event_status, date_from, date_to)
+    if cursor:
+        position = decode_cursor(cursor)
+        if "date" not in position or not isinstance(position.get("_id"), ObjectId):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        conditions.append(keyset_condition("date", position["date"], position["_id"]))
+
+    match = {"$and": conditions} if conditions else None
     db = await get_db()
-    events = await db.events.find().to_list(length=None)
+    # Берем на один документ больше, чтобы понять, есть ли следующая страница
+    events = await db.events.aggregate(
+        build_event_pipeline(match, sort={"date": 1, "_id": 1}, limit=limit + 1)
+    ).to_list(length=None)
+
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        last = events[-1]
+        next_cursor = encode_cursor({"date": last.get("date"), "_id": ObjectId(last["_id"])})
+
+    return {"events": _format_events(events), "next_cursor": next_cursor}
+
+
+async def stream_events(
+    category_id: str = None,
+    event_status: Status = None,
+    date_from: datetime = None,
+    date_to: datetime = None
+):
+    """
+    Асинхронный генератор строк NDJSON со всеми мероприятиями, подходящими под фильтры.
+    Документы читаются из курсора пачками по EXPORT_BATCH_SIZE, поэтому
+    потребление памяти не зависит от размера коллекции.
+    """
+    conditions = _build_event_filters(category_id, event_status, date_from, date_to)
+    match = {"$and": conditions} if conditions else None
+    db = await get_db()
+    cursor = db.events.aggregate(
+        build_event_pipeline(match, sort={"date": 1, "_id": 1}),
+        batchSize=settings.EXPORT_BATCH_SIZE
+    )
+    async for event in cursor:
+        for formatted_event in _format_events([event]):
+            yield formatted_event.model_dump_json(by_alias=True) + "\n"
+
+
+def _build_event_filters(
+    category_id: str = None,
+    event_status: Status = None,
+    date_from: datetime = None,
+    date_to: datetime = None
+) -> list:
+    conditions = []
+    if category_id:
+        conditions.append({"category_id": category_id})
+    if event_status:
+        conditions.append({"status": Status(event_status).value})
+    date_range = {}
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lt"] = date_to
+    if date_range:
+        conditions.append({"date": date_range})
+    return conditions
+
+
+def build_event_pipeline(
+    match: dict = None,
+    organizer_info: bool = False,
+    sort: dict = None,
+    limit: int = None
+) -> list:
+    """
+    Собирает aggregation pipeline, который за один запрос возвращает мероприятия
+    в форме Event: название категории вместо category_id, число участников и, если organizer_info=True, данные организатора для get_user_info_string.
+    Сортировка и limit применяются до $lookup, чтобы не обогащать лишние документы.
+    """
+    pipeline = []
+    if match:
+        pipeline.append({"$match": match})
+    if sort:
+        pipeline.append({"$sort": sort})
+    if limit:
+        pipeline.append({"$limit": limit})
+
+    # organizers хранится либо строкой, либо списком id - берем первого организатора
+    organizer_id = {"$cond": [
+        {"$isArray": "$organizers"},
+        {"$arrayElemAt": ["$organizers", 0]},
+        "$organizers"
+    ]}
+    pipeline.append({"$addFields": {
+        "_category_oid": _to_object_id("$category_id"),
+        "_organizer_oid": _to_object_id(organizer_id),
+    }})
+    pipeline.append({"$lookup": {
+        "from": "categories",
+        "localField": "_category_oid",
+        "foreignField": "_id",
+        "as": "_category"
+    }})
+    if organizer_info:
+        pipeline.append({"$lookup": {
+            "from": "users",
+            "localField": "_organizer_oid",
+            "foreignField": "_id",
+            "as": "_organizer"
+        }})
+        # $lookup возвращает массив; пустой документ вместо отсутствующего организатора
+        # оставляет поле _organizer в результате, и _format_events отвечает 404
+        pipeline.append({"$addFields": {
+            "_organizer": {"$ifNull": [{"$arrayElemAt": ["$_organizer", 0]}, {}]}
+        }})
+
+    project = {
+        "_id": {"$toString": "$_id"},
+        "name": 1,
+        "date": 1,
+        "location": 1,
+        "status": 1,
+        "category_id": {"$ifNull": [{"$arrayElemAt": ["$_category.name", 0]}, "Нет"]},
+        "participant_count": {"$ifNull": ["$participant_count", 0]},
+        "capacity": {"$ifNull": ["$capacity", None]},
+        "waitlist_count": {"$ifNull": ["$waitlist_count", 0]},
+        "organizers": {"$ifNull": [{"$toString": organizer_id}, ""]},
+        "photos": {"$ifNull": ["$photos", []]},
+        "description": {"$ifNull": ["$description", ""]},
+        "age_limit": {"$ifNull": ["$age_limit", "0+"]},
+        "for_roles": {"$ifNull": ["$for_roles", []]},
+    }
+    if organizer_info:
+        # Берем из документа организатора только поля, нужные для format_user_info
+        for field in ("name", "surname", "email", "phone_number"):
+            project[f"_organizer.{field}"] = 1
+    pipeline.append({"$project": project})
+    return pipeline
+
+
+def _to_object_id(expression):
+    return {"$convert": {"input": expression, "to": "objectId", "onError": None, "onNull": None}}
+
+
+async def _aggregate_events(pipeline: list, session=None) -> list:
+    """
+    Выполняет pipeline из build_event_pipeline и собирает модели Event.
+    """
+    db = await get_db()
+    events = await db.events.aggregate(pipeline, session=session).to_list(length=None)
+    return _format_events(events)
+
+
+def _format_events(events: list) -> list:
+    """
+    Собирает модели Event из результатов build_event_pipeline. Pipeline уже
+    приводит документы к форме Event, поэтому модели собираются без валидации.
+    Невалидные мероприятия пропускаются, как и раньше.
+    """
     formatted_events = []
     for event in events:
+        organizer_info = "_organizer" in event
+        organizer = event.pop("_organizer", None)
         try:
-            validated_event = await validate_event(event)
-            formatted_events.append(validated_event)
+            if organizer_info:
+                if not organizer:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+                event["organizers"] = format_user_info(organizer)
+            formatted_events.append(from_document(Event, event))
         except HTTPException as e:
             print(f"Skipping event {event.get('_id')}: {e.detail}") # Логируем факт пропуска события
             continue #Пропускаем событие
@@ -247,31 +387,6 @@ async def get_all_events():
     return formatted_events
 
 
-
-async def validate_event(event: dict) -> Event:
-    """
-    Проверяет валидность события и форматирует его.
-    Выбрасывает HTTPException, если событие не валидно.
-    """
-
-    event["_id"] = str(event["_id"])
-
-    # Преобразуем organizers и participants в списки строк
-    event["participants"] = [str(part_id) if isinstance(part_id, ObjectId) else part_id for part_id in event.get("participants", [])]
-
-    # Получаем категорию
-    category = await get_category_by_id(event.get("category_id"))
-    org=event.get("organizers")
-    if (len(str(org[0]))>1):
-        event["organizers"]=str(org[0])
-    event["category_id"] = category
-    event["photos"] = event.get("photos", [])
-    event["description"] = event.get("description", "")
-    event["age_limit"] = event.get("age_limit", "0+")
-    event["for_roles"] = event.get("for_roles", [])
-    print(event)
-    return Event(**event)
-
 async def get_user_info_string(user_id: str) -> str:
     """
     "Имя Фамилия, email, телефон (если есть)".
@@ -282,6 +397,13 @@ async def get_user_info_string(user_id: str) -> str:
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
+    return format_user_info(user)
+
+
+def format_user_info(user: dict) -> str:
+    """
+    Формирует строку "Имя Фамилия, email, телефон (если есть)" из документа пользователя.
+    """
     name = user.get("name", "")  # Получаем имя, подстраховываясь от отсутствия
     surname = user.get("surname", "")  # Получаем фамилию
     email = user.get("email", "")  # Получаем email
@@ -292,4 +414,4 @@ async def get_user_info_string(user_id: str) -> str:
     if phone_number:
         user_info += f" {phone_number}"  # Добавляем телефон, если он есть
 
-    return user_info
\ No newline at end of file
+    return user_info
@@ -0,0 +1,103 @@
+"""
+Проверка и обработка загружаемых изображений.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from config import settings
+from typing import Dict, Optional, Tuple
+import asyncio
+import multiprocessing
+import os
+
+# Сигнатуры форматов: (смещение, байты) -> (расширение, content type)
+_SIGNATURES = [
+    ((0, b"\xff\xd8\xff"), ("jpeg", "image/jpeg")),
+    ((0, b"\x89PNG\r\n\x1a\n"), ("png", "image/png")),
+    ((0, b"GIF87a"), ("gif", "image/gif")),
+    ((0, b"GIF89a"), ("gif", "image/gif")),
+    ((8, b"WEBP"), ("webp", "image/webp")),
+]
+
+SNIFF_BYTES = 16
+
+
+def sniff_image_format(header: bytes) -> Optional[Tuple[str, str]]:
+    """
+    Определяет формат изображения по первым байтам файла, не декодируя его.
+    Возвращает (расширение, content type) или None для неподдерживаемых файлов.
+    """
+    for (offset, signature), image_format in _SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            if image_format[0] == "webp" and not header.startswith(b"RIFF"):
+                continue
+            return image_format
+    return None
+
+
+# Производные изображения: имя -> (размер в пикселях или None для исходного размера, квадратная обрезка)
+DERIVATIVES = {
+    "avatar": (128, True),
+    "card": (480, False),
+    "full": (None, False),
+}
+DERIVATIVE_FORMAT = "webp"
+DERIVATIVE_CONTENT_TYPE = "image/webp"
+
+
+def render_derivatives(source_path: str, output_dir: str) -> Dict[str, str]:
+    """
+    Строит производные изображения из DERIVATIVES в формате WebP.
+    Выполняется в отдельном процессе, поэтому принимает и возвращает пути к файлам.
+    """
+    paths = {}
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        for name, (size, square) in DERIVATIVES.items():
+            if size is None:
+                derivative = image
+            elif square:
+                derivative = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            else:
+                derivative = image.copy()
+                derivative.thumbnail((size, size * 4), Image.LANCZOS)
+            path = os.path.join(output_dir, f"{name}.{DERIVATIVE_FORMAT}")
+            derivative.save(path, DERIVATIVE_FORMAT.upper(), quality=80, method=4)
+            paths[name] = path
+    return paths
+
+
+class ImageProcessor:
+    """
+    Пул процессов для работы Pillow, чтобы декодирование и сжатие изображений
+    не занимали event loop и не конкурировали за GIL с обработкой запросов.
+
+    Пул создается в lifespan приложения (start) и запускает процессы через
+    forkserver: fork процесса, в котором уже работают event loop и фоновые
+    потоки Motor/pymongo, может оставить дочерний процесс с захваченными блокировками.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+
+    async def render(self, source_path: str, output_dir: str) -> Dict[str, str]:
+        # Без lifespan (скрипты, тесты) пул создается при первой обработке
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, render_derivatives, source_path, output_dir)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+image_processor = ImageProcessor(workers=settings.IMAGE_PROCESS_WORKERS)
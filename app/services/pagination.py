@@ -0,0 +1,38 @@
+from bson import json_util
+from fastapi import HTTPException, status
+import base64
+import binascii
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Упаковывает позицию keyset-пагинации (значения полей сортировки) в непрозрачную строку.
+    """
+    raw = json_util.dumps(position).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Распаковывает строку из encode_cursor.
+    Выбрасывает HTTPException 400, если курсор поврежден.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json_util.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return position
+
+
+def keyset_condition(field: str, value, last_id, direction: int = 1) -> dict:
+    """
+    Условие "строго после (value, last_id)" для сортировки по (field, _id).
+    """
+    op = "$gt" if direction == 1 else "$lt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "_id": {op: last_id}}
+    ]}
@@ -0,0 +1,130 @@
+"""
+Хеширование и проверка паролей вне event loop.
+
+bcrypt занимает сотни миллисекунд CPU, поэтому вычисления выполняются
+в отдельном ограниченном пуле потоков (bcrypt отпускает GIL). Очередь
+ожидания тоже ограничена: при всплеске логинов запросы ждут своей очереди,
+а при переполнении сразу получают 503, не занимая остальные маршруты.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from config import settings
+from typing import Optional, Tuple
+import asyncio
+import hmac
+import time
+
+# min_rounds = default_rounds: хеши с меньшей стоимостью считаются устаревшими
+# и перехешируются при следующем успешном входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS
+)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int, queue_timeout: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._slots
+
+    def _reject(self):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests, try again later",
+            headers={"Retry-After": "1"}
+        )
+
+    async def run(self, func, *args):
+        """
+        Выполняет func(*args) в пуле, соблюдая лимит очереди ожидания.
+        """
+        slots = self._get_slots()
+        if self.running + self.waiting >= self.workers + self.max_queue:
+            self._reject()
+
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+        finally:
+            self.waiting -= 1
+            self.wait_seconds += time.monotonic() - queued_at
+
+        self.running += 1
+        started_at = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.busy_seconds += time.monotonic() - started_at
+            slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "saturation": self.running / self.workers,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT
+)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, stored_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверяет пароль. Возвращает (совпал ли пароль, новый хеш или None).
+    Новый хеш возвращается, если сохраненный пароль нужно обновить: он
+    посчитан со старыми параметрами или хранится открытым текстом.
+    """
+    if pwd_context.identify(stored_password, required=False) is None:
+        # Пароли, сохраненные до включения хеширования
+        if not hmac.compare_digest(password.encode(), str(stored_password).encode()):
+            return False, None
+        return True, await hash_password(password)
+    return await password_hasher.run(pwd_context.verify_and_update, password, stored_password)
@@ -0,0 +1,232 @@
+"""
+Записи пользователей на мероприятия.
+
+Каждая запись - отдельный документ коллекции registrations с уникальным
+индексом (event_id, user_id), а в мероприятии хранятся только счетчики
+participant_count и waitlist_count. Размер документа мероприятия и ответов
+со списками мероприятий поэтому не зависит от числа участников; сами
+участники отдаются постранично через list_participants.
+
+Место на мероприятии с ограниченной вместимостью (capacity) занимается одним
+условным find_one_and_update: счетчик увеличивается, только если он меньше
+capacity, поэтому параллельные записи не могут превысить вместимость. Кто
+не получил место, попадает в лист ожидания и переводится в участники
+(в порядке записи), когда место освобождается.
+"""
+from app.database.database import get_db
+from app.schemas.schemas import RegistrationStatus
+from app.services.event_cache import shared_event_lists
+from app.services.pagination import encode_cursor, decode_cursor
+from bson import ObjectId
+from datetime import datetime
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+from typing import List
+
+REGISTERED = RegistrationStatus.REGISTERED.value
+WAITLISTED = RegistrationStatus.WAITLISTED.value
+
+
+def has_free_seat(event_oid: ObjectId) -> dict:
+    """
+    Условие на документ мероприятия: вместимость не задана или еще не исчерпана.
+    """
+    return {
+        "_id": event_oid,
+        "$or": [
+            {"capacity": None},
+            {"$expr": {"$lt": [{"$ifNull": ["$participant_count", 0]}, "$capacity"]}}
+        ]
+    }
+
+
+async def register_participant(event_id: str, user_id: str) -> str:
+    """
+    Записывает пользователя на мероприятие и возвращает статус записи:
+    registered или waitlisted, если свободных мест нет.
+    Повторную запись отклоняет уникальный индекс registrations.event_user_unique.
+    """
+    db = await get_db()
+    event_oid, user_oid = ObjectId(event_id), ObjectId(user_id)
+
+    if not await db.users.find_one({"_id": user_oid}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Занимаем место до вставки записи: проверка и увеличение счетчика - одна атомарная операция
+    seat = await db.events.find_one_and_update(
+        has_free_seat(event_oid),
+        {"$inc": {"participant_count": 1}},
+        projection={"date": 1}
+    )
+    if seat:
+        shared_event_lists.counters_changed(seat.get("date"))
+        try:
+            await _insert_registration(db, event_oid, user_oid, REGISTERED)
+        except HTTPException:
+            # Пользователь уже записан - возвращаем занятое место
+            await _release_seat(db, event_oid)
+            raise
+        return REGISTERED
+
+    if not await db.events.find_one({"_id": event_oid}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    registration_id = await _insert_registration(db, event_oid, user_oid, WAITLISTED)
+    event = await db.events.find_one_and_update(
+        {"_id": event_oid},
+        {"$inc": {"waitlist_count": 1}},
+        projection={"date": 1}
+    )
+    shared_event_lists.counters_changed(event and event.get("date"))
+    # Место могло освободиться между проверкой и вставкой в лист ожидания
+    promoted = await promote_waitlisted(event_oid)
+    return REGISTERED if registration_id in promoted else WAITLISTED
+
+
+async def cancel_registration(event_id: str, user_id: str) -> List[str]:
+    """
+    Отменяет запись пользователя на мероприятие. Если освободилось место,
+    его занимает первый из листа ожидания. Возвращает id переведенных пользователей.
+    """
+    db = await get_db()
+    event_oid = ObjectId(event_id)
+    registration = await db.registrations.find_one_and_delete(
+        {"event_id": event_oid, "user_id": ObjectId(user_id)},
+        projection={"status": 1}
+    )
+    if not registration:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Registration not found")
+
+    promoted_users = []
+    if registration.get("status") == WAITLISTED:
+        event = await db.events.find_one_and_update(
+            {"_id": event_oid},
+            {"$inc": {"waitlist_count": -1}},
+            projection={"date": 1}
+        )
+        shared_event_lists.counters_changed(event and event.get("date"))
+    else:
+        promoted_users = await _release_seat(db, event_oid)
+    return promoted_users
+
+
+async def promote_waitlisted(event_oid: ObjectId) -> List[ObjectId]:
+    """
+    Переводит записи из листа ожидания в участники, пока есть свободные места.
+    Место занимается тем же условным обновлением, что и при обычной записи;
+    если кандидата успели перевести или его запись отменили, место возвращается.
+    Возвращает _id переведенных записей.
+    """
+    db = await get_db()
+    promoted = []
+    while True:
+        candidate = await db.registrations.find_one(
+            {"event_id": event_oid, "status": WAITLISTED},
+            {"_id": 1},
+            sort=[("_id", 1)]
+        )
+        if not candidate:
+            return promoted
+
+        seat = await db.events.find_one_and_update(
+            has_free_seat(event_oid),
+            {"$inc": {"participant_count": 1, "waitlist_count": -1}},
+            projection={"date": 1}
+        )
+        if not seat:
+            return promoted
+        shared_event_lists.counters_changed(seat.get("date"))
+
+        registration = await db.registrations.find_one_and_update(
+            {"_id": candidate["_id"], "status": WAITLISTED},
+            {"$set": {"status": REGISTERED, "promoted_at": datetime.utcnow()}},
+            projection={"_id": 1}
+        )
+        if registration:
+            promoted.append(candidate["_id"])
+        else:
+            await db.events.update_one(
+                {"_id": event_oid},
+                {"$inc": {"participant_count": -1, "waitlist_count": 1}}
+            )
+
+
+async def list_participants(
+    event_id: str,
+    limit: int = 50,
+    cursor: str = None,
+    registration_status: RegistrationStatus = RegistrationStatus.REGISTERED
+) -> dict:
+    """
+    Возвращает страницу участников мероприятия (или листа ожидания) в порядке записи.
+    Курсор - _id последней записи предыдущей страницы (индекс event_status_id).
+    """
+    db = await get_db()
+    event_oid = ObjectId(event_id)
+    if not await db.events.find_one({"_id": event_oid}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+
+    query = {"event_id": event_oid, "status": RegistrationStatus(registration_status).value}
+    if cursor:
+        position = decode_cursor(cursor)
+        if not isinstance(position.get("_id"), ObjectId):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query["_id"] = {"$gt": position["_id"]}
+
+    # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+    registrations = await db.registrations.find(
+        query, {"user_id": 1, "registered_at": 1}
+    ).sort("_id", 1).limit(limit + 1).to_list(length=None)
+
+    next_cursor = None
+    if len(registrations) > limit:
+        registrations = registrations[:limit]
+        next_cursor = encode_cursor({"_id": registrations[-1]["_id"]})
+
+    return {
+        "participants": [
+            {"user_id": str(registration["user_id"]), "registered_at": registration.get("registered_at")}
+            for registration in registrations
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+async def registered_event_ids(user_id: str) -> List[ObjectId]:
+    """
+    Возвращает id мероприятий, на которые пользователь записан участником (индекс user_status).
+    """
+    db = await get_db()
+    registrations = await db.registrations.find(
+        {"user_id": ObjectId(user_id), "status": REGISTERED}, {"event_id": 1, "_id": 0}
+    ).to_list(length=None)
+    return [registration["event_id"] for registration in registrations]
+
+
+async def _insert_registration(db, event_oid: ObjectId, user_oid: ObjectId, registration_status: str) -> ObjectId:
+    try:
+        result = await db.registrations.insert_one({
+            "event_id": event_oid,
+            "user_id": user_oid,
+            "status": registration_status,
+            "registered_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User already registered for this event")
+    return result.inserted_id
+
+
+async def _release_seat(db, event_oid: ObjectId) -> List[str]:
+    event = await db.events.find_one_and_update(
+        {"_id": event_oid},
+        {"$inc": {"participant_count": -1}},
+        projection={"date": 1}
+    )
+    shared_event_lists.counters_changed(event and event.get("date"))
+    promoted = await promote_waitlisted(event_oid)
+    if not promoted:
+        return []
+    registrations = await db.registrations.find(
+        {"_id": {"$in": promoted}}, {"user_id": 1}
+    ).to_list(length=None)
+    return [str(registration["user_id"]) for registration in registrations]
@@ -0,0 +1,363 @@
+"""
+Асинхронный доступ к хранилищу изображений.
+
+Бэкенд выбирается настройкой STORAGE_BACKEND:
+- "s3" - Backblaze B2 (или другой S3-совместимый сервис), ссылки подписываются;
+- "local" - файлы на диске в LOCAL_STORAGE_DIR, отдаются маршрутом /api/images/{key}.
+
+Блокирующие операции (boto3, запись файлов) выполняются в отдельном пуле
+потоков и не занимают event loop, число одновременных загрузок ограничено.
+"""
+from abc import ABC, abstractmethod
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from collections import OrderedDict
+from typing import AsyncIterator, BinaryIO, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+import asyncio
+import boto3
+import functools
+import os
+import re
+import shutil
+import tempfile
+import time
+
+
+def digest_from_key(key: str) -> Optional[str]:
+    """
+    Извлекает хеш из ключа оригинала или варианта; None для ключей вне images/.
+    """
+    if not key or not key.startswith("images/"):
+        return None
+    digest = re.split(r"[./]", key[len("images/"):], maxsplit=1)[0]
+    return digest if re.fullmatch(r"[0-9a-f]{64}", digest) else None
+
+
+class PresignedUrlCache:
+    """
+    LRU-кэш подписанных ссылок. Время делится на окна подписи длиной window
+    (срок действия ссылки минус PRESIGNED_URL_REFRESH_MARGIN), границы окон
+    считаются по часам и совпадают во всех воркерах. Ссылка отдается только
+    в том окне, в котором подписана, поэтому после конца окна ей остается жить
+    не меньше PRESIGNED_URL_REFRESH_MARGIN, а одно изображение все окно
+    отдается по одному URL.
+    """
+
+    def __init__(self, max_size: int, window: float):
+        self.max_size = max_size
+        self.window = window
+        self._entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+
+    def epoch(self) -> int:
+        """
+        Номер текущего окна подписи.
+        """
+        return int(time.time() // self.window)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        signed_in, url = entry
+        if signed_in != self.epoch():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return url
+
+    def put(self, key: str, url: str):
+        self._entries[key] = (self.epoch(), url)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class StorageBackend(ABC):
+    def __init__(self, workers: int, max_concurrent_uploads: int):
+        self.workers = workers
+        self.max_concurrent_uploads = max_concurrent_uploads
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._upload_slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="storage")
+        return self._executor
+
+    def _get_upload_slots(self) -> asyncio.Semaphore:
+        if self._upload_slots is None:
+            self._upload_slots = asyncio.Semaphore(self.max_concurrent_uploads)
+        return self._upload_slots
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    @abstractmethod
+    async def upload_fileobj(self, fileobj: BinaryIO, key: str, content_type: str):
+        ...
+
+    @abstractmethod
+    async def upload_stream(self, chunks: AsyncIterator[bytes], key: str, content_type: str):
+        ...
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """
+        Ссылка, по которой клиент может скачать объект.
+        """
+
+    @abstractmethod
+    def object_key(self, value: str) -> Optional[str]:
+        """
+        Возвращает ключ объекта для значения из базы или запроса: сам ключ
+        или ссылку на объект в этом хранилище. Для внешних ссылок возвращает None.
+        """
+
+    def resolve_url(self, value: Optional[str]) -> Optional[str]:
+        """
+        Превращает сохраненное значение (ключ или старую ссылку) в актуальную ссылку.
+        Ссылки выдаются только на загруженные изображения (ключи images/<sha256>),
+        для остальных ключей хранилища возвращается None.
+        """
+        key = self.object_key(value)
+        if not key:
+            return value
+        return self.url(key) if digest_from_key(key) else None
+
+    def signing_epoch(self) -> int:
+        """
+        Номер окна, в котором подписаны выдаваемые сейчас ссылки; меняется,
+        когда ссылки подписываются заново. Ссылки без срока действия - всегда 0.
+        """
+        return 0
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class S3StorageBackend(StorageBackend):
+    def __init__(self, workers: int, max_concurrent_uploads: int, max_pool_connections: int):
+        super().__init__(workers, max_concurrent_uploads)
+        self.max_pool_connections = max_pool_connections
+        self.bucket = settings.BACKBLAZE_BUCKET_NAME
+        self._client = None
+        self._url_cache = PresignedUrlCache(
+            max_size=settings.PRESIGNED_URL_CACHE_SIZE,
+            window=settings.PRESIGNED_URL_EXPIRES - settings.PRESIGNED_URL_REFRESH_MARGIN
+        )
+
+    def signing_epoch(self) -> int:
+        return self._url_cache.epoch()
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=settings.BACKBLAZE_ENDPOINT_URL,
+                aws_access_key_id=settings.BACKBLAZE_KEY_ID,
+                aws_secret_access_key=settings.BACKBLAZE_APPLICATION_KEY,
+                config=Config(
+                    signature_version='v4',
+                    s3={'checksum_algorithm': None},
+                    max_pool_connections=self.max_pool_connections
+                )
+            )
+        return self._client
+
+    async def upload_fileobj(self, fileobj: BinaryIO, key: str, content_type: str):
+        async with self._get_upload_slots():
+            await self._run(
+                self._get_client().upload_fileobj,
+                Fileobj=fileobj,
+                Bucket=self.bucket,
+                Key=key,
+                ExtraArgs={"ContentType": content_type}
+            )
+
+    async def upload_stream(self, chunks: AsyncIterator[bytes], key: str, content_type: str):
+        """
+        Загружает поток частей в хранилище. Каждая часть (кроме последней) должна
+        быть не меньше 5 МБ - ограничение S3 multipart upload. Следующая часть
+        читается только после загрузки предыдущей, поэтому в памяти находится
+        не больше двух частей.
+        """
+        client = self._get_client()
+        async with self._get_upload_slots():
+            first = await _next_chunk(chunks)
+            second = await _next_chunk(chunks) if first is not None else None
+            if second is None:
+                # Маленький файл - одна часть, multipart не нужен
+                await self._run(
+                    client.put_object,
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body=first or b"",
+                    ContentType=content_type
+                )
+                return
+
+            upload = await self._run(
+                client.create_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                ContentType=content_type
+            )
+            upload_id = upload["UploadId"]
+            parts = []
+            try:
+                chunk, part_number = first, 1
+                while chunk is not None:
+                    response = await self._run(
+                        client.upload_part,
+                        Bucket=self.bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=chunk
+                    )
+                    parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+                    if second is not None:
+                        chunk, second = second, None
+                    else:
+                        chunk = await _next_chunk(chunks)
+                    part_number += 1
+                await self._run(
+                    client.complete_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+            except BaseException:
+                await self._run(
+                    client.abort_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id
+                )
+                raise
+
+    def url(self, key: str) -> str:
+        """
+        Возвращает подписанную ссылку на объект из кэша, подписывая заново
+        только новые ключи и ссылки, срок действия которых подходит к концу.
+        Подпись считается локально, без сетевых запросов.
+        """
+        url = self._url_cache.get(key)
+        if url is None:
+            url = self._get_client().generate_presigned_url(
+                ClientMethod='get_object',
+                Params={'Bucket': self.bucket, 'Key': key},
+                ExpiresIn=settings.PRESIGNED_URL_EXPIRES
+            )
+            self._url_cache.put(key, url)
+        return url
+
+    def object_key(self, value: str) -> Optional[str]:
+        if not value:
+            return None
+        parsed = urlsplit(value)
+        if not parsed.scheme:
+            return value
+        endpoint = urlsplit(settings.BACKBLAZE_ENDPOINT_URL).netloc
+        path = unquote(parsed.path)
+        if parsed.netloc == endpoint and path.startswith(f"/{self.bucket}/"):
+            return path[len(self.bucket) + 2:]
+        if parsed.netloc == f"{self.bucket}.{endpoint}":
+            return path.lstrip("/")
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Хранилище в локальной директории для одиночных инсталляций и нагрузочных тестов.
+    """
+
+    def __init__(self, root: str, url_prefix: str, workers: int, max_concurrent_uploads: int):
+        super().__init__(workers, max_concurrent_uploads)
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def path_for(self, key: str) -> str:
+        """
+        Путь к файлу объекта. Ключи, выходящие за пределы LOCAL_STORAGE_DIR, отклоняются.
+        """
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root or path == self.root:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _write(self, source: BinaryIO, key: str):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл и переименовываем, чтобы не отдавать недописанный объект
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def upload_fileobj(self, fileobj: BinaryIO, key: str, content_type: str):
+        async with self._get_upload_slots():
+            await self._run(self._write, fileobj, key)
+
+    async def upload_stream(self, chunks: AsyncIterator[bytes], key: str, content_type: str):
+        path = self.path_for(key)
+        async with self._get_upload_slots():
+            await self._run(os.makedirs, os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+            try:
+                with os.fdopen(fd, "wb") as target:
+                    async for chunk in chunks:
+                        await self._run(target.write, chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{quote(key)}"
+
+    def object_key(self, value: str) -> Optional[str]:
+        if not value:
+            return None
+        parsed = urlsplit(value)
+        path = unquote(parsed.path)
+        if path.startswith(self.url_prefix + "/"):
+            return path[len(self.url_prefix) + 1:]
+        return None if parsed.scheme else value
+
+
+def create_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorageBackend(
+            root=settings.LOCAL_STORAGE_DIR,
+            url_prefix=settings.LOCAL_STORAGE_URL_PREFIX,
+            workers=settings.STORAGE_WORKERS,
+            max_concurrent_uploads=settings.STORAGE_MAX_CONCURRENT_UPLOADS
+        )
+    if settings.STORAGE_BACKEND == "s3":
+        return S3StorageBackend(
+            workers=settings.STORAGE_WORKERS,
+            max_concurrent_uploads=settings.STORAGE_MAX_CONCURRENT_UPLOADS,
+            max_pool_connections=settings.STORAGE_MAX_POOL_CONNECTIONS
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+
+
+async def _next_chunk(chunks: AsyncIterator[bytes]) -> Optional[bytes]:
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+storage = create_storage()
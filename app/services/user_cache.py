@@ -0,0 +1,155 @@
+"""
+Кэш профилей пользователей в памяти процесса (LRU + TTL).
+
+Все операции, изменяющие документ пользователя, вызывают invalidate_user.
+При нескольких воркерах можно включить канал инвалидации
+(USER_CACHE_INVALIDATION=mongo): события сбрасывания пишутся в capped-коллекцию
+cache_invalidations, и каждый воркер читает ее tailable-курсором.
+"""
+from app.database.database import get_db
+from app.schemas.schemas import User
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+from collections import OrderedDict
+from config import settings
+from datetime import datetime
+from typing import Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_COLLECTION = "cache_invalidations"
+
+
+class UserProfileCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[User]:
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() >= entry[0]:
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: str, user: User, generation: int):
+        # Профиль, прочитанный до инвалидации, мог уже устареть - не кэшируем его
+        if generation != self.generation:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        self.generation += 1
+        self.invalidations += 1
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class InvalidationChannel:
+    """
+    Рассылка инвалидаций между воркерами через capped-коллекцию MongoDB.
+    """
+
+    def __init__(self, cache: UserProfileCache):
+        self.cache = cache
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        db = await get_db()
+        try:
+            await db.create_collection(INVALIDATION_COLLECTION, capped=True, size=1024 * 1024, max=10000)
+        except CollectionInvalid:
+            pass
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, user_id: str):
+        db = await get_db()
+        await db[INVALIDATION_COLLECTION].insert_one({
+            "user_id": user_id,
+            "origin": self.worker_id,
+            "created_at": datetime.utcnow()
+        })
+
+    async def _listen(self):
+        db = await get_db()
+        collection = db[INVALIDATION_COLLECTION]
+        last = await collection.find_one(sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+        while True:
+            try:
+                query = {"_id": {"$gt": last_id}} if last_id else {}
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for message in cursor:
+                        last_id = message["_id"]
+                        if message.get("origin") != self.worker_id:
+                            self.cache.invalidate(message["user_id"])
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"User cache invalidation channel error: {e}")
+            # Курсор закрылся (например, коллекция была пустой) - переоткрываем его
+            await asyncio.sleep(1)
+
+
+user_cache = UserProfileCache(max_size=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+invalidation_channel = InvalidationChannel(user_cache)
+
+
+async def invalidate_user(*user_ids):
+    """
+    Сбрасывает профили пользователей в кэше этого воркера и, если канал включен, во всех остальных.
+    """
+    for user_id in user_ids:
+        user_id = str(user_id)
+        user_cache.invalidate(user_id)
+        if invalidation_channel.enabled:
+            try:
+                await invalidation_channel.publish(user_id)
+            except PyMongoError as e:
+                logger.warning(f"Failed to publish user cache invalidation: {e}")
@@ -0,0 +1,82 @@
+"""
+Поиск пользователей по префиксам слов.
+
+Для каждого пользователя в поле search_tokens хранятся префиксы (edge n-grams)
+слов из имени, фамилии и email в нижнем регистре. Поиск по терминам запроса -
+это точное совпадение с элементами массива, которое обслуживает индекс по search_tokens.
+Сами слова целиком (в той же нормализации) хранятся в search_words для сортировки
+по релевантности.
+"""
+from typing import List
+import re
+
+MAX_GRAM_LENGTH = 15
+SEARCH_FIELDS = ("name", "surname", "email")
+
+
+def normalize_words(text: str) -> List[str]:
+    """
+    Разбивает строку на слова в нижнем регистре ("Пётр.Иванов@hse.ru" -> ["петр", "иванов", "hse", "ru"]).
+    """
+    return re.findall(r"\w+", str(text).lower().replace("ё", "е"))
+
+
+def edge_ngrams(word: str) -> List[str]:
+    return [word[:length] for length in range(1, min(len(word), MAX_GRAM_LENGTH) + 1)]
+
+
+def build_search_tokens(user: dict) -> List[str]:
+    """
+    Возвращает значение поля search_tokens для документа пользователя.
+    """
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        for word in normalize_words(user.get(field) or ""):
+            tokens.update(edge_ngrams(word))
+    return sorted(tokens)
+
+
+def build_search_words(user: dict) -> List[str]:
+    """
+    Возвращает значение поля search_words: нормализованные слова целиком.
+    """
+    words = set()
+    for field in SEARCH_FIELDS:
+        words.update(normalize_words(user.get(field) or ""))
+    return sorted(words)
+
+
+def build_search_fields(user: dict) -> dict:
+    """
+    Поля поиска (search_tokens и search_words) для документа пользователя.
+    """
+    return {"search_tokens": build_search_tokens(user), "search_words": build_search_words(user)}
+
+
+def search_terms(search: str) -> List[str]:
+    return [word[:MAX_GRAM_LENGTH] for word in normalize_words(search)]
+
+
+def search_filter(search: str) -> dict:
+    """
+    Условие для $match/find: каждый термин запроса должен быть префиксом
+    какого-то слова пользователя.
+    """
+    terms = search_terms(search)
+    if not terms:
+        return {}
+    return {"search_tokens": {"$all": terms}}
+
+
+def relevance_expression(search: str) -> dict:
+    """
+    Выражение aggregation для сортировки по релевантности: слово запроса, совпавшее
+    со словом пользователя целиком (search_words), весит больше, чем совпавший префикс.
+    Слова сравниваются в нормализации normalize_words (нижний регистр, ё -> е), которую
+    $toLower не повторяет для кириллицы.
+    """
+    words = {"$ifNull": ["$search_words", []]}
+    return {"$add": [
+        {"$cond": [{"$in": [word, words]}, 2, 1]}
+        for word in normalize_words(search)
+    ] or [0]}
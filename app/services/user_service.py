@@ -1,12 +1,16 @@
 from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
-from app.schemas.schemas import User, UserCreate, Role, Event, Achievement
-from app.database.database import get_db
-from passlib.context import CryptContext
+from app.schemas.schemas import User, UserCreate, Role, Event, Achievement, from_document
+from app.database.database import get_db, causal_session
+from app.services.password_service import hash_password, verify_password
 from fastapi import HTTPException, status
 from bson import ObjectId
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.user_search import build_search_fields, SEARCH_FIELDS
+from app.services.blob_service import update_blob_references, to_stored_image
+from app.services.user_cache import user_cache, invalidate_user
+from app.services.registration_service import register_participant, cancel_registration
 
 
 async def create_user(user_data: UserCreate):
@@ -17,20 +21,26 @@ async def create_user(user_data: UserCreate):
             detail="User with this email already exists"
         )
 
-    #hashed_password = pwd_context.hash(user_data.password)
     user_dict = user_data.model_dump(exclude={"id"})  # Исключаем id из входных данных
     user_dict.update({
-        "password": user_data.password,
+        "password": await hash_password(user_data.password),
         "events_attended": 0,
         "events_organized": 0
     })
-
-    result = await db.users.insert_one(user_dict)
-    created_user = await db.users.find_one({"_id": result.inserted_id})
-
-    # Преобразуем ObjectId в строку перед возвратом
-    created_user["_id"] = str(created_user["_id"])
-    return User(**created_user)
+    user_dict.update(build_search_fields(user_dict))
+
+    # Чтение созданного документа в той же сессии видит запись даже на реплике
+    async with causal_session() as session:
+        try:
+            result = await db.users.insert_one(user_dict, session=session)
+        except DuplicateKeyError:
+            # Параллельная регистрация с тем же email - ловит уникальный индекс users.email
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this email already exists"
+            )
+        created_user = await db.users.find_one({"_id": result.inserted_id}, session=session)
+    return _user_from_document(created_user)
 
 async def authenticate_user(email: str, password: str) -> User:
     """
@@ -45,18 +55,19 @@ async def authenticate_user(email: str, password: str) -> User:
             detail="Incorrect email or password"
         )
 
-    try:
-    #hashed_password =pwd_context.hash(password)
-        if (password!=user["password"]):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Incorrect email or password"
-            )
-        user["_id"] = str(user["_id"])
-        res=await get_full_info_about_user(user["_id"])
-        return res
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=user)
+    password_ok, new_hash = await verify_password(password, user["password"])
+    if not password_ok:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Incorrect email or password"
+        )
+    if new_hash:
+        # Хеш посчитан со старыми параметрами (или пароль хранился открытым текстом)
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        await invalidate_user(user["_id"])
+
+    return await get_full_info_about_user(str(user["_id"]))
+
 async def get_user_by_id(user_id: str):
     db = await get_db()
     user = await db.users.find_one({"_id": ObjectId(user_id)})
@@ -64,13 +75,28 @@ async def get_user_by_id(user_id: str):
 
 
 async def get_full_info_about_user(user_id: str) -> User:
+    cached_user = user_cache.get(str(user_id))
+    if cached_user is not None:
+        return cached_user
+
     db = await get_db()
+    generation = user_cache.generation
 
     # Получаем пользователя из базы
     user = await db.users.find_one({"_id": ObjectId(user_id)})
     if not user:
         return None
 
+    # Создаем, кэшируем и возвращаем объект User
+    result = _user_from_document(user)
+    user_cache.put(str(user_id), result, generation)
+    return result
+
+
+def _user_from_document(user: dict) -> User:
+    """
+    Собирает User из документа коллекции users без повторной валидации.
+    """
     # Преобразуем ObjectId в строки для всех полей с ID
     user_data = {
         **user,
@@ -79,9 +105,7 @@ async def get_full_info_about_user(user_id: str) -> User:
         "favorite_events": [str(event_id) for event_id in user.get("favorite_events", [])],
         "achievements": [str(achievement_id) for achievement_id in user.get("achievements", [])]
     }
-
-    # Создаем и возвращаем объект User
-    return User(**user_data)
+    return from_document(User, user_data)
 
 
 async def add_friend_service(user_oid: ObjectId, friend_oid: ObjectId):
@@ -117,50 +141,40 @@ async def add_friend_service(user_oid: ObjectId, friend_oid: ObjectId):
         {"_id": friend_oid},
         {"$addToSet": {"friends": user_oid}}
     )
+    await invalidate_user(user_oid, friend_oid)
 
     return True
 
-async def register_user_for_event(event_id: str, user_id: str):
-    db = await get_db()
-
-    # Verify event exists
-    event = await db.events.find_one({"_id": ObjectId(event_id)})
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    # Verify user exists
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Check if user is already registered
-    if ObjectId(user_id) in [ObjectId(participant) for participant in event.get("participants", [])]:
-        raise HTTPException(status_code=400, detail="User already registered for this event")
+async def register_user_for_event(event_id: str, user_id: str) -> str:
+    # Проверка повторной записи - уникальный индекс registrations, а не массив в мероприятии
+    return await register_participant(event_id, user_id)
 
-    # Register user for event
-    await db.events.update_one(
-        {"_id": ObjectId(event_id)},
-        {"$addToSet": {"participants": ObjectId(user_id)}}
-    )
-
-    return True
+async def cancel_user_registration(event_id: str, user_id: str):
+    return await cancel_registration(event_id, user_id)
 async def update_user_profile_picture(user_id: str, picture_url: str) -> User:
     """
     Обновляет URL картинки профиля пользователя.
     """
     db = await get_db()
-    result = await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"profile_picture": picture_url}}
-    )
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="User not found")
+    picture = await to_stored_image(picture_url)
+    async with causal_session() as session:
+        previous = await db.users.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": {"profile_picture": picture}},
+            projection={"profile_picture": 1},
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if not previous:
+            raise HTTPException(status_code=404, detail="User not found")
+        await invalidate_user(user_id)
+        # Ссылка переходит со старого изображения на новое (для одного и того же - ничего не меняется)
+        await update_blob_references([previous.get("profile_picture")], [picture])
 
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, session=session)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user["_id"] = str(user["_id"])
-    return User(**user)
+    return _user_from_document(user)
 
 async def update_user(user_id: str, user_data: dict) -> User:
     """
@@ -174,14 +188,28 @@ async def update_user(user_id: str, user_data: dict) -> User:
     if user_data.get("birthday"):
       user_data["birthday"] = datetime.strptime(user_data["birthday"], "%Y-%m-%dT%H:%M:%S")
 
-    result = await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": user_data}
-    )
+    if user_data.get("profile_picture"):
+        user_data["profile_picture"] = await to_stored_image(user_data["profile_picture"])
 
-    if result.modified_count == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    if user_data.get("password"):
+        user_data["password"] = await hash_password(user_data["password"])
+
+    if any(field in user_data for field in SEARCH_FIELDS):
+        user_data.update(build_search_fields({**user, **user_data}))
+
+    async with causal_session() as session:
+        result = await db.users.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$set": user_data},
+            session=session
+        )
+
+        if result.modified_count == 0:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        await invalidate_user(user_id)
+        if "profile_picture" in user_data:
+            await update_blob_references([user.get("profile_picture")], [user_data["profile_picture"]])
 
-    updated_user = await db.users.find_one({"_id": ObjectId(user_id)})
+        updated_user = await db.users.find_one({"_id": ObjectId(user_id)}, session=session)
     updated_user["_id"] = str(updated_user["_id"])
     return User(**updated_user)
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Сравнение двух отчетов benchmarks.run (например, до и после изменения).
+
+    python -m benchmarks.compare benchmarks/reports/base.json benchmarks/reports/head.json --max-regression 10
+
+Печатает p50/p95/p99 и RPS по сценариям и их изменение в процентах.
+С --max-regression завершается с кодом 1, если p95 какого-либо сценария
+вырос больше чем на указанный процент.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "rps")
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def compare(base: dict, head: dict) -> list:
+    rows = []
+    for name, head_result in head["scenarios"].items():
+        base_result = base["scenarios"].get(name)
+        if base_result is None:
+            continue
+        rows.append({
+            "scenario": name,
+            **{metric: (base_result[metric], head_result[metric], _change(base_result[metric], head_result[metric]))
+               for metric in METRICS}
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--max-regression", type=float, default=None, help="допустимый рост p95, %%")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+
+    print(f"base {base['meta'].get('commit') or args.base} -> head {head['meta'].get('commit') or args.head}")
+    regressions = []
+    for row in compare(base, head):
+        cells = [f"{metric} {before:>9.2f} -> {after:>9.2f} ({change:+6.1f}%)" for metric, (before, after, change)
+                 in ((metric, row[metric]) for metric in METRICS)]
+        print(f"{row['scenario']:<14} " + "  ".join(cells))
+        if args.max_regression is not None and row["p95_ms"][2] > args.max_regression:
+            regressions.append(row["scenario"])
+
+    if regressions:
+        print(f"p95 regression above {args.max_regression}%: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Бенчмарк конкурентной записи на одно мероприятие с ограниченной вместимостью.
+
+Все пользователи одновременно отправляют POST /api/users/{event_id}/register/{user_id}
+(часть из них - дважды), затем часть участников отменяет запись. После каждой
+фазы проверяется, что участников ровно min(capacity, пользователей), счетчики
+мероприятия совпадают с коллекцией registrations, а лист ожидания продвигается
+в порядке очереди. Отчет - задержки записи и отмены (как в benchmarks.run)
+и результат проверок; при нарушении инвариантов код возврата 1.
+
+Примеры:
+    python -m benchmarks.contention --users 5000 --capacity 500 --db dvizh_contention
+    python -m benchmarks.contention --mongodb-url mongomock:// --users 500 --capacity 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from benchmarks.run import summarize, _git_commit
+
+
+async def _fire(requests: List, concurrency: int) -> dict:
+    """
+    Выполняет корутины requests одновременно (не больше concurrency в полете,
+    0 - без ограничения) и возвращает сводку задержек и кодов ответа.
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency or len(requests) or 1)
+
+    async def timed(request):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await request()
+            except Exception as e:
+                errors += 1
+                statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                return None
+            latency = time.perf_counter() - started
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        # 400 - ожидаемый ответ на повторную запись
+        if response.status_code >= 500 or response.status_code not in (200, 400):
+            errors += 1
+        else:
+            latencies.append(latency)
+        return response
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(request) for request in requests))
+    return summarize(latencies, statuses, errors, time.perf_counter() - started)
+
+
+async def check_invariants(db, event_id, capacity: int, expected_registered: int) -> Dict[str, bool]:
+    event = await db.events.find_one({"_id": event_id})
+    registered = await db.registrations.count_documents({"event_id": event_id, "status": "registered"})
+    waitlisted = await db.registrations.count_documents({"event_id": event_id, "status": "waitlisted"})
+    pairs = await db.registrations.aggregate([
+        {"$match": {"event_id": event_id}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]).to_list(length=None)
+    return {
+        "registered_equals_expected": registered == expected_registered,
+        "capacity_not_exceeded": registered <= capacity,
+        "participant_count_matches": event.get("participant_count", 0) == registered,
+        "waitlist_count_matches": event.get("waitlist_count", 0) == waitlisted,
+        "no_duplicate_registrations": not pairs,
+        "waitlist_only_when_full": waitlisted == 0 or registered == capacity,
+    }
+
+
+async def _main(args) -> dict:
+    # Настройки читаются при импорте config, поэтому окружение задается до импорта приложения
+    os.environ["MONGODB_URL"] = args.mongodb_url
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+
+    import httpx
+    from app.database import database
+    from bson import ObjectId
+    from main import app
+
+    rng = random.Random(args.seed)
+    async with app.router.lifespan_context(app):
+        db = database.db
+        users = [ObjectId() for _ in range(args.users)]
+        await db.users.insert_many([
+            {"_id": user_id, "name": "Contention", "surname": str(i), "email": f"contention{i}-{user_id}@bench.hse.ru"}
+            for i, user_id in enumerate(users)
+        ])
+        event_id = ObjectId()
+        await db.events.insert_one({
+            "_id": event_id,
+            "name": "Contention benchmark",
+            "date": datetime.now() + timedelta(days=7),
+            "location": "Онлайн",
+            "category_id": "",
+            "photos": [],
+            "description": "",
+            "age_limit": "0+",
+            "for_roles": [],
+            "organizers": "",
+            "status": "planned",
+            "capacity": args.capacity,
+            "participant_count": 0,
+            "waitlist_count": 0,
+        })
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            def register(user_id):
+                return lambda: client.post(f"/api/users/{event_id}/register/{user_id}")
+
+            def cancel(user_id):
+                return lambda: client.delete(f"/api/users/{event_id}/register/{user_id}")
+
+            attempts = [register(user_id) for user_id in users]
+            attempts += [register(user_id) for user_id in rng.sample(users, int(len(users) * args.duplicates))]
+            rng.shuffle(attempts)
+            registration = await _fire(attempts, args.concurrency)
+            after_registration = await check_invariants(db, event_id, args.capacity, min(args.capacity, args.users))
+
+            registered = await db.registrations.find(
+                {"event_id": event_id, "status": "registered"}, {"user_id": 1}
+            ).to_list(length=None)
+            queue_head = await db.registrations.find(
+                {"event_id": event_id, "status": "waitlisted"}, {"user_id": 1}
+            ).sort("_id", 1).limit(args.cancellations).to_list(length=None)
+            cancelled = rng.sample([r["user_id"] for r in registered], min(args.cancellations, len(registered)))
+            cancellation = await _fire([cancel(user_id) for user_id in cancelled], args.concurrency)
+
+            after_cancellation = await check_invariants(
+                db, event_id, args.capacity, min(args.capacity, args.users - len(cancelled))
+            )
+            # Освободившиеся места должны достаться первым в очереди
+            promoted = await db.registrations.count_documents({
+                "event_id": event_id,
+                "status": "registered",
+                "user_id": {"$in": [r["user_id"] for r in queue_head[:len(cancelled)]]}
+            })
+            after_cancellation["waitlist_promoted_in_order"] = promoted == min(len(cancelled), len(queue_head))
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "backend": "memory" if args.mongodb_url.startswith(database.IN_MEMORY_URL_SCHEME) else "mongodb",
+                "users": args.users,
+                "capacity": args.capacity,
+                "duplicate_attempts": len(attempts) - len(users),
+                "cancellations": len(cancelled),
+                "concurrency": args.concurrency or len(attempts),
+            },
+            "registration": registration,
+            "cancellation": cancellation,
+            "checks": {"after_registration": after_registration, "after_cancellation": after_cancellation},
+        }
+
+        await db.registrations.delete_many({"event_id": event_id})
+        await db.events.delete_one({"_id": event_id})
+        await db.users.delete_many({"_id": {"$in": users}})
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default=os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="dvizh_contention")
+    parser.add_argument("--users", type=int, default=5000, help="одновременных записей")
+    parser.add_argument("--capacity", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="доля пользователей, которые записываются дважды")
+    parser.add_argument("--cancellations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=0, help="запросов в полете, 0 - все сразу")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(_main(args))
+    rendered = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(rendered + "\n")
+    else:
+        print(rendered)
+    passed = all(all(checks.values()) for checks in report["checks"].values())
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Прогон сценариев нагрузки против приложения FastAPI в том же процессе
+(httpx.ASGITransport, lifespan приложения выполняется как при обычном старте).
+
+База - локальная MongoDB или база в памяти (MONGODB_URL=mongomock://, нужен
+mongomock-motor). База в памяти подходит для проверки самих сценариев, но не
+для измерений: она не поддерживает $convert в aggregation pipeline и ведет себя
+иначе, чем сервер. Сценарии на pipeline мероприятий (AGGREGATION_SCENARIOS)
+с ней не запускаются: при --scenarios all они пропускаются, явный запрос
+отклоняется.
+
+Примеры:
+    python -m benchmarks.seed --scale 100k --db dvizh_bench --drop
+    python -m benchmarks.run --db dvizh_bench --requests 2000 --concurrency 32 --output benchmarks/reports/$(git rev-parse --short HEAD).json
+
+    python -m benchmarks.run --mongodb-url mongomock:// --seed-scale 2000 --scenarios registration,admin_search
+
+Отчет - JSON с p50/p95/p99, средней и максимальной задержкой (мс), RPS
+и распределением кодов ответа по каждому сценарию. Отчеты разных коммитов
+сравнивает benchmarks.compare.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    Перцентиль методом ближайшего ранга.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    to_ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": to_ms(percentile(ordered, 50)),
+        "p95_ms": to_ms(percentile(ordered, 95)),
+        "p99_ms": to_ms(percentile(ordered, 99)),
+        "mean_ms": to_ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "max_ms": to_ms(ordered[-1]) if ordered else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+async def run_scenario(name: str, scenario, client, fixtures, requests: int, concurrency: int, rng: random.Random) -> dict:
+    """
+    rng общий для прогрева и измерения сценария: измерение продолжает
+    последовательность прогрева, а не повторяет те же запросы.
+    """
+    from benchmarks.scenarios import EXPECTED_CLIENT_ERRORS
+
+    expected = EXPECTED_CLIENT_ERRORS.get(name, set())
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, fixtures, rng)
+            except Exception as e:
+                errors += 1
+                statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                continue
+            latency = time.perf_counter() - started
+            status = response.status_code
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status >= 500 or (status >= 400 and status not in expected):
+                errors += 1
+            else:
+                latencies.append(latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - started)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def _main(args) -> dict:
+    # Настройки читаются при импорте config, поэтому окружение задается до импорта приложения
+    os.environ["MONGODB_URL"] = args.mongodb_url
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+
+    import httpx
+    from app.database import database
+    from app.database.indexes import sync_indexes
+    from app.services.category_service import category_registry
+    from app.services.event_cache import shared_event_lists
+    from benchmarks.scenarios import AGGREGATION_SCENARIOS, SCENARIOS, load_fixtures
+    from benchmarks.seed import parse_scale, seed
+    from main import app
+
+    in_memory = args.mongodb_url.startswith(database.IN_MEMORY_URL_SCHEME)
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+    if in_memory:
+        unsupported = [name for name in names if name in AGGREGATION_SCENARIOS]
+        if unsupported and args.scenarios != "all":
+            raise SystemExit(f"Scenarios {', '.join(unsupported)} need a MongoDB server: the in-memory backend lacks $convert")
+        if unsupported:
+            print(f"Skipping {', '.join(unsupported)} on the in-memory backend", file=sys.stderr)
+            names = [name for name in names if name not in AGGREGATION_SCENARIOS]
+
+    async with app.router.lifespan_context(app):
+        seed_summary = None
+        if args.seed_scale:
+            seed_summary = await seed(
+                database.db,
+                users_count=parse_scale(args.seed_scale),
+                seed_value=args.seed,
+                drop=True,
+                in_memory=in_memory
+            )
+            # drop удалил и индексы, в том числе уникальный индекс записей на мероприятия
+            await sync_indexes()
+            category_registry.invalidate()
+            shared_event_lists.invalidate()
+        fixtures = await load_fixtures(database.db)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            results = {}
+            for index, name in enumerate(names):
+                scenario = SCENARIOS[name]
+                rng = random.Random(args.seed + index)
+                if args.warmup:
+                    await run_scenario(name, scenario, client, fixtures, args.warmup, args.concurrency, rng)
+                results[name] = await run_scenario(
+                    name, scenario, client, fixtures, args.requests, args.concurrency, rng
+                )
+                print(f"{name}: {json.dumps(results[name], ensure_ascii=False)}", file=sys.stderr)
+
+        return {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "backend": "memory" if in_memory else "mongodb",
+                "users": await database.db.users.count_documents({}),
+                "events": await database.db.events.count_documents({}),
+                "seed": seed_summary,
+                "requests_per_scenario": args.requests,
+                "concurrency": args.concurrency,
+            },
+            "scenarios": results,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default=os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="dvizh_bench")
+    parser.add_argument("--scenarios", default="all", help="список через запятую или all")
+    parser.add_argument("--requests", type=int, default=1000, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=50, help="запросов на прогрев перед измерением")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-scale", default=None, help="засеять базу перед прогоном (обязательно для mongomock://)")
+    parser.add_argument("--output", default=None, help="файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    # Логи отдельных запросов только замедляют прогон; basicConfig в main.py после этого ничего не меняет
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(_main(args))
+    rendered = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(rendered + "\n")
+    else:
+        print(rendered)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Сценарии нагрузки. Каждый сценарий - корутина, которая выполняет один
+пользовательский запрос через httpx-клиент и возвращает ответ.
+
+Идентификаторы берутся из Fixtures - выборки данных, загруженной из базы
+перед прогоном, поэтому сценарии работают с любой засеянной базой.
+"""
+from benchmarks.seed import BENCHMARK_PASSWORD, LAST_NAMES
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+import httpx
+import random
+
+FIXTURE_SAMPLE_SIZE = 2000
+
+
+@dataclass
+class Fixtures:
+    user_ids: List[str]
+    emails: List[str]
+    event_ids: List[str]
+    search_terms: List[str]
+    # Пары (event_id, user_id), уже записанные в базе или использованные сценарием registration
+    registered_pairs: Set[Tuple[str, str]] = field(default_factory=set)
+
+
+async def load_fixtures(db, sample_size: int = FIXTURE_SAMPLE_SIZE) -> Fixtures:
+    users = await db.users.find({"is_active": {"$ne": False}}, {"email": 1}).limit(sample_size).to_list(length=None)
+    events = await db.events.find({}, {"_id": 1}).limit(sample_size).to_list(length=None)
+    if not users or not events:
+        raise RuntimeError("Benchmark database is empty - run benchmarks.seed first")
+    registrations = await db.registrations.find(
+        {"event_id": {"$in": [event["_id"] for event in events]}, "user_id": {"$in": [user["_id"] for user in users]}},
+        {"event_id": 1, "user_id": 1, "_id": 0}
+    ).to_list(length=None)
+    return Fixtures(
+        user_ids=[str(user["_id"]) for user in users],
+        emails=[user["email"] for user in users],
+        event_ids=[str(event["_id"]) for event in events],
+        # Префиксы фамилий - типичный поиск в админке
+        search_terms=[name[:length].lower() for name in LAST_NAMES for length in (2, 4)],
+        registered_pairs={(str(r["event_id"]), str(r["user_id"])) for r in registrations},
+    )
+
+
+Scenario = Callable[[httpx.AsyncClient, Fixtures, random.Random], Awaitable[httpx.Response]]
+
+
+async def homepage(client: httpx.AsyncClient, fixtures: Fixtures, rng: random.Random) -> httpx.Response:
+    return await client.get(f"/api/users/home/{rng.choice(fixtures.user_ids)}")
+
+
+async def event_list(client: httpx.AsyncClient, fixtures: Fixtures, rng: random.Random) -> httpx.Response:
+    return await client.get("/api/events/", params={"limit": 20})
+
+
+async def event_detail(client: httpx.AsyncClient, fixtures: Fixtures, rng: random.Random) -> httpx.Response:
+    return await client.get(f"/api/events/{rng.choice(fixtures.event_ids)}")
+
+
+async def registration(client: httpx.AsyncClient, fixtures: Fixtures, rng: random.Random) -> httpx.Response:
+    # Пары выбираются без возвращения (и в прогреве, и в измерении), чтобы
+    # измерялась запись, а не отказ на повторную регистрацию
+    if len(fixtures.registered_pairs) >= len(fixtures.event_ids) * len(fixtures.user_ids):
+        raise RuntimeError("No unregistered (event, user) pairs left in fixtures")
+    while True:
+        pair = (rng.choice(fixtures.event_ids), rng.choice(fixtures.user_ids))
+        if pair not in fixtures.registered_pairs:
+            break
+    fixtures.registered_pairs.add(pair)
+    event_id, user_id = pair
+    return await client.post(f"/api/users/{event_id}/register/{user_id}")
+
+
+async def login(client: httpx.AsyncClient, fixtures: Fixtures, rng: random.Random) -> httpx.Response:
+    return await client.post(
+        "/api/users/login",
+        params={"email": rng.choice(fixtures.emails), "password": BENCHMARK_PASSWORD}
+    )
+
+
+async def admin_search(client: httpx.AsyncClient, fixtures: Fixtures, rng: random.Random) -> httpx.Response:
+    return await client.get("/api/admins/users", params={"search": rng.choice(fixtures.search_terms), "limit": 20})
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "homepage": homepage,
+    "event_list": event_list,
+    "event_detail": event_detail,
+    "registration": registration,
+    "login": login,
+    "admin_search": admin_search,
+}
+
+# Ответы 4xx, которые для сценария нормальны
+EXPECTED_CLIENT_ERRORS: Dict[str, Set[int]] = {}
+
+# Сценарии на aggregation pipeline с $convert (build_event_pipeline): база в памяти
+# (mongomock) его не поддерживает, и такие сценарии отвечают 500 на каждый запрос
+AGGREGATION_SCENARIOS = {"homepage", "event_list", "event_detail"}
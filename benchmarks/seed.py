@@ -0,0 +1,343 @@
+"""
+Генератор синтетических данных для бенчмарков: categories, users (с избранным
+и графом друзей), events и registrations (записи участников).
+
+Масштаб задается числом пользователей: 10k, 100k, 1m или любое число.
+Мероприятий по умолчанию в 10 раз меньше, чем пользователей. Данные
+детерминированы при одинаковых --seed и --epoch: id строятся из номера
+документа, даты отсчитываются от epoch, поэтому прогоны на разных коммитах
+сравнимы. У всех пользователей один пароль (BENCHMARK_PASSWORD): bcrypt для
+миллиона пользователей считался бы часами, поэтому хеш (с солью из --seed)
+считается один раз.
+
+Документы строятся и вставляются пачками по --batch-size, поэтому память не
+растет с масштабом. Счетчики участия и граф друзей дописываются пачками
+обновлений после вставки пользователей.
+
+Мероприятия распределены на полгода вокруг epoch. Чтобы блоки "сегодня" и
+"на этой неделе" главной страницы не были пустыми, передайте текущую дату:
+    python -m benchmarks.seed --scale 100k --epoch $(date +%F) --db dvizh_bench --drop
+
+Запуск (локальная MongoDB, база dvizh_bench будет очищена):
+    python -m benchmarks.seed --scale 100k --mongodb-url mongodb://localhost:27017 --db dvizh_bench --drop
+"""
+import os
+
+os.environ.setdefault("STORAGE_BACKEND", "local")
+
+from app.schemas.schemas import Status
+from app.services.password_service import pwd_context
+from app.services.user_search import build_search_fields
+from bson import ObjectId
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from typing import Dict, List, Tuple
+import argparse
+import asyncio
+import calendar
+import logging
+import random
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BENCHMARK_PASSWORD = "benchmark-password"
+SEEDED_COLLECTIONS = ("categories", "users", "events", "registrations")
+DEFAULT_EPOCH = datetime(2025, 1, 1)
+
+# Пространства id: id документа - (epoch, пространство, номер), одинаковые при каждом запуске
+CATEGORY_IDS, USER_IDS, EVENT_IDS, REGISTRATION_IDS = 1, 2, 3, 4
+BCRYPT_SALT_ALPHABET = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+CATEGORY_NAMES = [
+    "Конференция", "Митап", "Хакатон", "Лекция", "Мастер-класс", "Концерт", "Выставка",
+    "Спорт", "Кино", "Настольные игры", "Волонтерство", "Карьера", "Олимпиада", "Фестиваль",
+]
+FIRST_NAMES = [
+    "Иван", "Петр", "Анна", "Мария", "Алексей", "Дмитрий", "Елена", "Ольга", "Сергей", "Наталья",
+    "Андрей", "Татьяна", "Михаил", "Екатерина", "Никита", "Юлия", "Артем", "Дарья", "Кирилл", "Полина",
+]
+LAST_NAMES = [
+    "Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков",
+    "Морозов", "Волков", "Алексеев", "Федоров", "Михайлов", "Беляев", "Тарасов", "Белов", "Комаров",
+]
+LOCATIONS = ["Москва, Покровский б-р 11", "Москва, ул. Мясницкая 20", "Санкт-Петербург, ул. Союза Печатников 16",
+             "Нижний Новгород, ул. Родионова 136", "Пермь, ул. Студенческая 38", "Онлайн"]
+ROLES = ["Студент", "Школьник", "Преподаватель", "Выпускник"]
+
+
+def parse_scale(value: str) -> int:
+    value = value.lower()
+    return SCALES[value] if value in SCALES else int(value)
+
+
+def seeded_id(epoch: datetime, namespace: int, index: int) -> ObjectId:
+    """
+    Детерминированный ObjectId: время - epoch, затем пространство и номер документа.
+    """
+    return ObjectId(struct.pack(">IBxxxI", calendar.timegm(epoch.timetuple()), namespace, index))
+
+
+def _popular_index(rng: random.Random, size: int) -> int:
+    # Популярность мероприятий и пользователей неравномерна: часть из них собирает
+    # основную долю участников и друзей (распределение, близкое к Парето)
+    return min(int(rng.paretovariate(1.2)) - 1, size - 1) if rng.random() < 0.5 else rng.randrange(size)
+
+
+def benchmark_password_hash(rng: random.Random) -> str:
+    salt = "".join(rng.choice(BCRYPT_SALT_ALPHABET) for _ in range(21)) + "e"
+    return pwd_context.handler("bcrypt").using(salt=salt).hash(BENCHMARK_PASSWORD)
+
+
+def build_categories(epoch: datetime) -> List[dict]:
+    return [{"_id": seeded_id(epoch, CATEGORY_IDS, i), "name": name} for i, name in enumerate(CATEGORY_NAMES)]
+
+
+def build_users(
+    start: int,
+    count: int,
+    events_count: int,
+    rng: random.Random,
+    epoch: datetime,
+    password_hash: str,
+    favorites_per_user: int
+) -> List[dict]:
+    """
+    Пользователи с номерами [start, start + count). Друзья и счетчики участия
+    заполняются позже (link_friends, _apply_counters).
+    """
+    users = []
+    for i in range(start, start + count):
+        name = rng.choice(FIRST_NAMES)
+        surname = rng.choice(LAST_NAMES)
+        favorites = (
+            _popular_index(rng, events_count)
+            for _ in range(rng.randint(0, favorites_per_user))
+        )
+        user = {
+            "_id": seeded_id(epoch, USER_IDS, i),
+            "name": name,
+            "surname": surname,
+            "email": f"user{i}@bench.hse.ru",
+            "birthday": datetime(1990, 1, 1) + timedelta(days=rng.randrange(365 * 20)),
+            "password": password_hash,
+            "sex": rng.choice(["Мужской", "Женский"]),
+            "role": rng.choice(ROLES),
+            # dict.fromkeys сохраняет порядок: set зависел бы от PYTHONHASHSEED
+            "favorite_events": list(dict.fromkeys(seeded_id(epoch, EVENT_IDS, index) for index in favorites)),
+            "friends": [],
+            "achievements": [],
+            "events_attended": 0,
+            "events_organized": 0,
+            "is_active": rng.random() > 0.02,
+        }
+        user.update(build_search_fields(user))
+        users.append(user)
+    return users
+
+
+def build_events(
+    start: int,
+    count: int,
+    users_count: int,
+    categories: List[dict],
+    rng: random.Random,
+    epoch: datetime,
+    participants_per_event: int,
+    first_registration: int
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Мероприятия с номерами [start, start + count) на полгода назад и вперед от
+    epoch; часть из них приходится на день epoch и его неделю.
+    Возвращает мероприятия и записи участников на них.
+    """
+    events = []
+    registrations = []
+    for i in range(start, start + count):
+        if rng.random() < 0.05:
+            date = epoch + timedelta(hours=rng.randrange(-48, 96))
+        else:
+            date = epoch + timedelta(days=rng.randrange(-180, 180), hours=rng.randrange(24))
+        organizer = seeded_id(epoch, USER_IDS, rng.randrange(users_count))
+        participants = dict.fromkeys(
+            _popular_index(rng, users_count)
+            for _ in range(int(rng.expovariate(1 / participants_per_event)))
+        )
+        event_id = seeded_id(epoch, EVENT_IDS, i)
+        for user_index in participants:
+            registrations.append({
+                "_id": seeded_id(epoch, REGISTRATION_IDS, first_registration + len(registrations)),
+                "event_id": event_id,
+                "user_id": seeded_id(epoch, USER_IDS, user_index),
+                "status": "registered",
+                "registered_at": epoch,
+            })
+        events.append({
+            "_id": event_id,
+            "name": f"{rng.choice(CATEGORY_NAMES)} #{i}",
+            "date": date,
+            "location": rng.choice(LOCATIONS),
+            "category_id": str(rng.choice(categories)["_id"]),
+            "photos": [],
+            "description": "Синтетическое мероприятие для нагрузочного тестирования. " * 3,
+            "age_limit": rng.choice(["0+", "12+", "16+", "18+"]),
+            "for_roles": rng.sample(ROLES, rng.randint(1, len(ROLES))),
+            "organizers": str(organizer),
+            "status": (Status.COMPLETED if date < epoch else Status.PLANNED).value,
+            "participant_count": len(participants),
+            "waitlist_count": 0,
+        })
+    return events, registrations
+
+
+def link_friends(start: int, count: int, users_count: int, rng: random.Random, epoch: datetime, friends_per_user: int) -> Dict[ObjectId, List[ObjectId]]:
+    """
+    Ребра графа друзей для пользователей [start, start + count): пользователь -> новые друзья.
+    Ребро добавляется в обе стороны, поэтому граф симметричен.
+    """
+    added = defaultdict(list)
+    for i in range(start, start + count):
+        for _ in range(rng.randint(0, friends_per_user)):
+            friend = _popular_index(rng, users_count)
+            if friend != i:
+                user_id, friend_id = seeded_id(epoch, USER_IDS, i), seeded_id(epoch, USER_IDS, friend)
+                added[user_id].append(friend_id)
+                added[friend_id].append(user_id)
+    return added
+
+
+async def _insert(collection, documents: List[dict]):
+    if documents:
+        await collection.insert_many(documents, ordered=False)
+
+
+async def _update(collection, updates: List[Tuple[dict, dict]], in_memory: bool):
+    if not updates:
+        return
+    if in_memory:
+        # mongomock не принимает UpdateOne из pymongo 4.x в bulk_write
+        for query, update in updates:
+            await collection.update_one(query, update)
+        return
+    await collection.bulk_write([UpdateOne(query, update) for query, update in updates], ordered=False)
+
+
+async def _apply_counters(db, field: str, counts: Counter, in_memory: bool):
+    await _update(db.users, [({"_id": user_id}, {"$inc": {field: count}}) for user_id, count in counts.items()], in_memory)
+
+
+async def seed(
+    db,
+    users_count: int,
+    events_count: int = None,
+    seed_value: int = 42,
+    participants_per_event: int = 30,
+    friends_per_user: int = 10,
+    favorites_per_user: int = 8,
+    drop: bool = False,
+    batch_size: int = 5000,
+    epoch: datetime = DEFAULT_EPOCH,
+    in_memory: bool = False
+) -> dict:
+    """
+    Заполняет базу синтетическими данными пачками по batch_size и возвращает сводку.
+    in_memory=True - база в памяти (mongomock): обновления выполняются по одному.
+    """
+    rng = random.Random(seed_value)
+    events_count = events_count if events_count is not None else max(users_count // 10, 1)
+    started = time.perf_counter()
+
+    if drop:
+        for name in SEEDED_COLLECTIONS:
+            await db[name].drop()
+
+    password_hash = benchmark_password_hash(rng)
+    categories = build_categories(epoch)
+    await _insert(db.categories, categories)
+
+    for start in range(0, users_count, batch_size):
+        count = min(batch_size, users_count - start)
+        await _insert(db.users, build_users(start, count, events_count, rng, epoch, password_hash, favorites_per_user))
+
+    registrations_count = 0
+    for start in range(0, events_count, batch_size):
+        count = min(batch_size, events_count - start)
+        events, registrations = build_events(
+            start, count, users_count, categories, rng, epoch, participants_per_event, registrations_count
+        )
+        await _insert(db.events, events)
+        await _insert(db.registrations, registrations)
+        registrations_count += len(registrations)
+        await _apply_counters(db, "events_organized", Counter(ObjectId(event["organizers"]) for event in events), in_memory)
+        await _apply_counters(db, "events_attended", Counter(r["user_id"] for r in registrations), in_memory)
+
+    for start in range(0, users_count, batch_size):
+        count = min(batch_size, users_count - start)
+        added = link_friends(start, count, users_count, rng, epoch, friends_per_user)
+        await _update(db.users, [
+            ({"_id": user_id}, {"$addToSet": {"friends": {"$each": friends}}})
+            for user_id, friends in added.items()
+        ], in_memory)
+
+    summary = {
+        "users": users_count,
+        "events": events_count,
+        "categories": len(categories),
+        "participants": registrations_count,
+        "seed": seed_value,
+        "epoch": epoch.isoformat(),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"Seeded benchmark data: {summary}")
+    return summary
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--scale", default="10k", help="число пользователей: 10k, 100k, 1m или число")
+    parser.add_argument("--events", type=int, default=None, help="число мероприятий (по умолчанию scale / 10)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--epoch", type=datetime.fromisoformat, default=DEFAULT_EPOCH,
+                        help="дата, от которой отсчитываются даты мероприятий (YYYY-MM-DD)")
+    parser.add_argument("--participants-per-event", type=int, default=30)
+    parser.add_argument("--friends-per-user", type=int, default=10)
+    parser.add_argument("--favorites-per-user", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=5000)
+
+
+async def _main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(args.mongodb_url)
+    try:
+        summary = await seed(
+            client[args.db],
+            users_count=parse_scale(args.scale),
+            events_count=args.events,
+            seed_value=args.seed,
+            participants_per_event=args.participants_per_event,
+            friends_per_user=args.friends_per_user,
+            favorites_per_user=args.favorites_per_user,
+            drop=args.drop,
+            batch_size=args.batch_size,
+            epoch=args.epoch
+        )
+        print(summary)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="dvizh_bench")
+    parser.add_argument("--drop", action="store_true", help="очистить коллекции перед заполнением")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Микробенчмарк сериализации мероприятий: стоимость одного мероприятия
+от документа из aggregation pipeline до байтов ответа.
+
+before - прежний путь: Event(**doc) -> model_dump() -> Event.model_validate()
+         (маршрут) -> jsonable_encoder -> json.dumps;
+after  - from_document (model_construct) -> orjson.
+
+Запуск из корня репозитория:
+    python -m benchmarks.serialization --events 20000
+"""
+import os
+
+# Бенчмарку не нужен S3 - ссылки на изображения строит локальное хранилище
+os.environ.setdefault("STORAGE_BACKEND", "local")
+
+from app.api.responses import render_json
+from app.schemas.schemas import Event, from_document
+from bson import ObjectId
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+import argparse
+import copy
+import json
+import time
+
+
+def make_documents(count: int) -> list:
+    """
+    Документы в той форме, в которой их возвращает build_event_pipeline. Участники
+    хранятся в registrations, в мероприятии - только счетчик, поэтому размер
+    документа от их числа не зависит.
+    """
+    start = datetime(2025, 1, 1, 10, 0)
+    return [
+        {
+            "_id": str(ObjectId()),
+            "name": f"Мероприятие {i}",
+            "date": start + timedelta(hours=i),
+            "location": "Москва, ул. Пушкина 10",
+            "status": "planned",
+            "category_id": "Конференция",
+            "participant_count": 20,
+            "organizers": "Иван Иванов, user@example.com",
+            "photos": [f"images/{i:064x}/card.webp"],
+            "description": "Описание мероприятия " * 10,
+            "age_limit": "16+",
+            "for_roles": ["Студент", "Школьник"],
+        }
+        for i in range(count)
+    ]
+
+
+def serialize_before(document: dict) -> bytes:
+    event_dict = Event(**document).model_dump()
+    event = Event.model_validate(event_dict)
+    return json.dumps(jsonable_encoder(event), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def serialize_after(document: dict) -> bytes:
+    return render_json(from_document(Event, document))
+
+
+def measure(serialize, documents: list) -> float:
+    # Копируем документы заранее: from_document меняет документ на месте
+    batch = copy.deepcopy(documents)
+    started = time.perf_counter()
+    for document in batch:
+        serialize(document)
+    return (time.perf_counter() - started) / len(batch) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = make_documents(args.events)
+    # Ответы должны совпадать, иначе сравнение бессмысленно
+    assert json.loads(serialize_before(copy.deepcopy(documents[0]))) == json.loads(serialize_after(copy.deepcopy(documents[0])))
+
+    before = min(measure(serialize_before, documents) for _ in range(args.repeat))
+    after = min(measure(serialize_after, documents) for _ in range(args.repeat))
+    print(json.dumps({
+        "events": args.events,
+        "before_us_per_event": round(before, 2),
+        "after_us_per_event": round(after, 2),
+        "speedup": round(before / after, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,53 @@ load_dotenv()
 class Settings(BaseSettings):
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DB_NAME: str = os.getenv("DB_NAME", "dvizh")
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+    MONGO_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000))
+    # Сжатие трафика: "zstd", "snappy", "zlib" или список через запятую; пусто - без сжатия
+    MONGO_COMPRESSORS: str = os.getenv("MONGO_COMPRESSORS", "")
+    MONGO_READ_PREFERENCE: str = os.getenv("MONGO_READ_PREFERENCE", "primary")
+    # Режим для обработчиков @read_only; maxStalenessSeconds не меньше 90, 0 - без ограничения
+    MONGO_READ_ONLY_PREFERENCE: str = os.getenv("MONGO_READ_ONLY_PREFERENCE", "secondaryPreferred")
+    MONGO_MAX_STALENESS_SECONDS: int = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", 90))
+    MONGO_ROUTE_READ_PREFERENCES: str = os.getenv("MONGO_ROUTE_READ_PREFERENCES", "")
+    CATEGORY_CACHE_TTL: int = int(os.getenv("CATEGORY_CACHE_TTL", 300))
+    # Сколько секунд живут списки "сегодня"/"на неделе" (изменения из других воркеров видны не позже)
+    EVENT_LIST_CACHE_TTL: int = int(os.getenv("EVENT_LIST_CACHE_TTL", 300))
+    # Сколько секунд списки "сегодня"/"на неделе" могут показывать старые счетчики участников
+    EVENT_LIST_COUNTER_TTL: int = int(os.getenv("EVENT_LIST_COUNTER_TTL", 30))
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL: int = int(os.getenv("USER_CACHE_TTL", 60))
+    USER_CACHE_INVALIDATION: str = os.getenv("USER_CACHE_INVALIDATION", "none")
+    HEALTH_PING_TIMEOUT: float = float(os.getenv("HEALTH_PING_TIMEOUT", 2))
+    DB_QUERY_DEBUG: bool = os.getenv("DB_QUERY_DEBUG", "false").lower() == "true"
+    N_PLUS_ONE_THRESHOLD: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", 3))
+    SYNC_INDEXES_ON_STARTUP: bool = os.getenv("SYNC_INDEXES_ON_STARTUP", "true").lower() == "true"
+    MIGRATION_LOCK_TIMEOUT_SECONDS: int = int(os.getenv("MIGRATION_LOCK_TIMEOUT_SECONDS", 600))
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5))
+    BACKBLAZE_KEY_ID: str = os.getenv("BACKBLAZE_KEY_ID", "")
+    BACKBLAZE_APPLICATION_KEY: str = os.getenv("BACKBLAZE_APPLICATION_KEY", "")
+    BACKBLAZE_ENDPOINT_URL: str = os.getenv("BACKBLAZE_ENDPOINT_URL", "")
+    BACKBLAZE_BUCKET_NAME: str = os.getenv("BACKBLAZE_BUCKET_NAME", "")
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "s3")
+    LOCAL_STORAGE_DIR: str = os.getenv("LOCAL_STORAGE_DIR", "storage")
+    LOCAL_STORAGE_URL_PREFIX: str = os.getenv("LOCAL_STORAGE_URL_PREFIX", "/api/images")
+    STORAGE_WORKERS: int = int(os.getenv("STORAGE_WORKERS", 8))
+    STORAGE_MAX_CONCURRENT_UPLOADS: int = int(os.getenv("STORAGE_MAX_CONCURRENT_UPLOADS", 4))
+    STORAGE_MAX_POOL_CONNECTIONS: int = int(os.getenv("STORAGE_MAX_POOL_CONNECTIONS", 10))
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+    UPLOAD_PART_SIZE: int = int(os.getenv("UPLOAD_PART_SIZE", 5 * 1024 * 1024))
+    IMAGE_PROCESS_WORKERS: int = int(os.getenv("IMAGE_PROCESS_WORKERS", 2))
+    PRESIGNED_URL_EXPIRES: int = int(os.getenv("PRESIGNED_URL_EXPIRES", 604800))
+    PRESIGNED_URL_REFRESH_MARGIN: int = int(os.getenv("PRESIGNED_URL_REFRESH_MARGIN", 86400))
+    PRESIGNED_URL_CACHE_SIZE: int = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", 10000))
 
     class Config:
         case_sensitive = True
@@ -1,8 +1,19 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
+from fastapi.responses import JSONResponse
 from app.api import users, events, admins, category,images
-from app.database.database import connect_to_mongo, close_mongo_connection
+from app.database.database import connect_to_mongo, close_mongo_connection, ping_database
+from app.database.read_routing import select_read_preference
+from app.monitoring.collectors import register_service_collectors
+from app.monitoring.metrics import CONTENT_TYPE, render_metrics
+from app.monitoring.middleware import MetricsMiddleware, QueryCountMiddleware
 from contextlib import asynccontextmanager
-from app.database.init_db import init_roles_and_statuses, init_categories
+from app.database.init_db import init_roles_and_statuses, init_categories, init_user_search_tokens, migrate_event_participants
+from app.database.indexes import sync_indexes
+from app.services.password_service import password_hasher
+from app.services.storage_service import storage
+from app.services.image_service import image_processor
+from app.services.user_cache import invalidation_channel
+from config import settings
 import logging
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -17,20 +28,41 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting application...")
     try:
+        # Пул обработки изображений живет столько же, сколько приложение (остановка - в finally)
+        image_processor.start()
+
         await connect_to_mongo()
         logger.info("Database connection established")
+
+        if settings.SYNC_INDEXES_ON_STARTUP:
+            await sync_indexes()
+            logger.info("Indexes synchronized")
         
         await init_roles_and_statuses()
         logger.info("Roles and statuses initialized")
         
         await init_categories()
         logger.info("Categories initialized")
+
+        await init_user_search_tokens()
+        logger.info("User search tokens initialized")
+
+        await migrate_event_participants()
+        logger.info("Event participants migrated")
+
+        if settings.USER_CACHE_INVALIDATION == "mongo":
+            await invalidation_channel.start()
+            logger.info("User cache invalidation channel started")
         
         yield
     except Exception as e:
         logger.error(f"Application initialization failed: {e}")
         raise
     finally:
+        await invalidation_channel.stop()
+        password_hasher.shutdown()
+        storage.shutdown()
+        image_processor.shutdown()
         await close_mongo_connection()
         logger.info("Application shutdown complete")
 
@@ -40,7 +72,8 @@ app = FastAPI(
     description="Backend for event management platform",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    dependencies=[Depends(select_read_preference)]
 )
 origins = ["http://localhost:5173", "https://dvizh-frontend-production.up.railway.app"]
 app.add_middleware(
@@ -49,7 +82,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-DB-Queries"],
 )
+app.add_middleware(images.UploadSizeLimitMiddleware)
+app.add_middleware(QueryCountMiddleware)
+# Добавлен последним, поэтому стоит снаружи и учитывает время всех остальных middleware
+app.add_middleware(MetricsMiddleware)
+register_service_collectors()
 app.include_router(users.router, prefix="/api/users")
 app.include_router(events.router, prefix="/api/events")
 app.include_router(admins.router, prefix="/api/admins")
@@ -61,4 +100,16 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "database": "connected"}
\ No newline at end of file
+    try:
+        latency = await ping_database(settings.HEALTH_PING_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Health check failed: {e!r}")
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "database": "unavailable"}
+        )
+    return {"status": "ok", "database": "connected", "ping_ms": round(latency * 1000, 2)}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
\ No newline at end of file